@@ -2,28 +2,120 @@ import os
 import cv2
 import base64
 import io
+import time
 from flask import Flask, render_template, request, jsonify, Response, send_from_directory, send_file
 from flask_cors import CORS
 from datetime import datetime
 from pathlib import Path
 import numpy as np
 from sqlalchemy import func, or_
-import pandas as pd
 from werkzeug.utils import secure_filename
 from functools import wraps
 
 from config import Config
 from database import init_db, get_db, Student, Attendance, Course, CourseEnrollment
-from face_detector import FaceDetector
-from face_recognizer import FaceRecognizer
+from model_loader import LazyModel
+from face_detector import FaceDetector, DETECTION_DTYPE, FACE_BACKENDS, camera_backend
+from inference_pool import InferencePool, analyze_frames
+from detection_scheduler import DetectionScheduler
+from face_tracker import FaceTracker
+from face_quality import score_face
+from motion_gate import MotionGate
+from camera_capture import CameraCapture
+from bulk_enrollment import bulk_enroll
 
 app = Flask(__name__)
 app.config.from_object(Config)
 CORS(app)
 
-# Initialize face detection and recognition
-face_detector = FaceDetector()
-face_recognizer = FaceRecognizer()
+def _load_face_detector(backend=None):
+    return FaceDetector(backend)
+
+def _load_face_recognizer():
+    from face_recognizer import FaceRecognizer
+    return FaceRecognizer()
+
+# Face detection and recognition load on first use (torch/TensorFlow imports are slow),
+# so CRUD endpoints are served immediately after startup
+face_detector = LazyModel('face_detector', _load_face_detector)
+face_recognizer = LazyModel('face_recognizer', _load_face_recognizer)
+face_detectors = {Config.DETECTOR_BACKEND: face_detector}  # Cameras may use other backends (CAMERA_DETECTOR_BACKENDS)
+
+def get_face_detector(backend=None):
+    """Lazily loaded detector of a backend (None for Config.DETECTOR_BACKEND)"""
+    backend = backend or Config.DETECTOR_BACKEND
+    if backend not in face_detectors:
+        face_detectors.setdefault(backend, LazyModel(f'face_detector_{backend}', lambda: _load_face_detector(backend)))
+    return face_detectors[backend]
+
+# With INFERENCE_WORKERS > 0 the models live in worker processes instead of this one
+inference_pool = None
+if Config.INFERENCE_WORKERS > 0:
+    inference_pool = InferencePool(Config.INFERENCE_WORKERS, Config.INFERENCE_QUEUE_SIZE,
+                                   Config.INFERENCE_MAX_BATCH, Config.INFERENCE_BATCH_WAIT_MS)
+
+# Live streams hand their frames to one scheduler per detector backend, so all
+# cameras using that backend share a batch
+detection_schedulers = {}
+
+def get_detection_scheduler(backend):
+    """Batch scheduler for the cameras of a detector backend, or None if CAMERA_BATCHING is off"""
+    if not Config.CAMERA_BATCHING:
+        return None
+    if backend not in detection_schedulers:
+        detection_schedulers.setdefault(backend, DetectionScheduler(
+            lambda frames: run_inference('detect_arrays', frames, backend), Config.CAMERA_BATCH_WAIT_MS
+        ))
+    return detection_schedulers[backend]
+
+def start_model_warmup():
+    """Load the face models in the background; progress is reported by /api/health"""
+    if inference_pool:
+        inference_pool.start()
+        return
+    face_detector.warm_up()
+    face_recognizer.warm_up()
+
+def run_inference(kind, *args, timeout=Config.INFERENCE_TIMEOUT):
+    """
+    Run a detection/recognition task on the worker pool, or in this thread if there is none
+
+    Args:
+        kind: 'analyze' (frame, candidates[, backend]), 'detect' (frame[, backend]),
+            'detect_batch' (frames[, backend]), 'detect_arrays' (frames[, backend]; structured
+            detections with scores and landmarks), 'recognize' (face_images, candidates[, tight_boxes]),
+            'recognize_top_k' (face_images, candidates, k[, tight_boxes]), 'enroll' (student_id, image)
+            or 'enroll_bulk' (items for FaceRecognizer.enroll_faces)
+        *args: Arguments of the task
+        timeout: Seconds to wait for the pool's result (None waits until done)
+
+    Returns:
+        The task's result; 'analyze' returns (boxes, [(student_id, confidence), ...])
+    """
+    if inference_pool:
+        future = inference_pool.submit(kind, *args, timeout=Config.INFERENCE_TIMEOUT)
+        return future.result(timeout=timeout)
+
+    if kind == 'analyze':
+        return analyze_frames(get_face_detector, face_recognizer, [args])[0]
+    if kind == 'detect':
+        frame, *backend = args
+        return get_face_detector(*backend).detect_faces(frame)
+    if kind == 'detect_batch':
+        frames, *backend = args
+        return get_face_detector(*backend).detect_faces_batch(frames)
+    if kind == 'detect_arrays':
+        frames, *backend = args
+        return get_face_detector(*backend).detect_batch(frames)
+    if kind == 'recognize':
+        return face_recognizer.recognize_faces(*args)
+    if kind == 'recognize_top_k':
+        return face_recognizer.recognize_faces_top_k(*args)
+    if kind == 'enroll':
+        return face_recognizer.enroll_face(*args)
+    if kind == 'enroll_bulk':
+        return face_recognizer.enroll_faces(*args)
+    raise ValueError(f"Unknown inference task '{kind}'")
 
 # Database session management decorator
 def with_db_session(f):
@@ -39,7 +131,11 @@ def with_db_session(f):
 
 # Global variable for video stream - for Mark Attendance tab
 cameras = {}  # Dictionary to store multiple camera instances
+camera_captures = {}  # Capture thread and latest-frame buffer per camera
 last_detected_students = {}  # Track recently detected students to avoid duplicates
+course_rosters = {}  # Cache of course_id -> (frozenset of enrolled student_id strings, load time)
+stream_trackers = {}  # Latest live stream's FaceTracker per camera, for statistics
+stream_motion_gates = {}  # Latest live stream's MotionGate per camera, for statistics
 from datetime import datetime, timedelta
 
 def get_camera(camera_index=None):
@@ -71,6 +167,24 @@ def get_camera(camera_index=None):
     else:
         return None
 
+def get_camera_capture(camera_index=None):
+    """Get the capture thread of a camera, opening the camera if needed (None if unavailable)"""
+    if camera_index is None:
+        camera_index = Config.CAMERA_INDEX
+    camera_index = int(camera_index)
+
+    capture = camera_captures.get(camera_index)
+    if capture is None or capture.ended or not capture.camera.isOpened():
+        camera = get_camera(camera_index)
+        if camera is None:
+            return None
+        if capture is not None:
+            # The old capture thread has stopped with its camera
+            camera_captures.pop(camera_index, None)
+        # Concurrent streams of one camera must share a single capture thread
+        capture = camera_captures.setdefault(camera_index, CameraCapture(camera, Config.CAPTURE_BUFFER_SIZE))
+    return capture
+
 def get_active_course(db):
     """Get currently active course based on current time and day"""
     current_time = datetime.now()
@@ -91,6 +205,40 @@ def get_active_course(db):
 
     return None
 
+def save_evidence_image(face_img, prefix):
+    """Write a face crop to disk as evidence for an Attendance row and return its path"""
+    image_path = Config.ATTENDANCE_PHOTOS_FOLDER / f"{prefix}_{datetime.now().timestamp()}.jpg"
+    cv2.imwrite(str(image_path), face_img)
+    return str(image_path)
+
+def get_course_roster(db, course_id):
+    """
+    Get the student IDs enrolled in a course
+
+    Cached until enrollments change in this process, and for at most
+    COURSE_ROSTER_TTL seconds so changes made through other workers are
+    picked up too.
+    """
+    cached = course_rosters.get(course_id)
+    if cached is not None and time.monotonic() - cached[1] < Config.COURSE_ROSTER_TTL:
+        return cached[0]
+    rows = db.query(Student.student_id).join(
+        CourseEnrollment, CourseEnrollment.student_id == Student.id
+    ).filter(
+        CourseEnrollment.course_id == course_id,
+        Student.is_active == True
+    ).all()
+    roster = frozenset(row[0] for row in rows)
+    course_rosters[course_id] = (roster, time.monotonic())
+    return roster
+
+def invalidate_course_rosters(course_id=None):
+    """Drop cached rosters for one course, or for all courses"""
+    if course_id is None:
+        course_rosters.clear()
+    else:
+        course_rosters.pop(int(course_id), None)
+
 @app.route('/')
 def index():
     """Render main page"""
@@ -152,7 +300,7 @@ def enroll_student_face(student_id):
         image_file.save(str(image_path))
 
         # Enroll face
-        success = face_recognizer.enroll_face(student.student_id, image_path)
+        success = run_inference('enroll', student.student_id, image_path)
 
         if success:
             student.face_encoding_path = str(image_path)
@@ -165,6 +313,27 @@ def enroll_student_face(student_id):
         db.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/students/bulk-enroll', methods=['POST'])
+def bulk_enroll_faces():
+    """Enroll faces from a ZIP archive laid out as <student_id>/*.jpg"""
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file provided'}), 400
+
+    file = request.files['file']
+    if not file.filename.lower().endswith('.zip'):
+        return jsonify({'success': False, 'error': 'Invalid file format. Please upload a ZIP archive'}), 400
+
+    db = next(get_db())
+    try:
+        # A large intake takes far longer than INFERENCE_TIMEOUT, so wait for it to finish
+        result = bulk_enroll(db, file.stream, lambda items: run_inference('enroll_bulk', items, timeout=None))
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        db.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        db.close()
+
 @app.route('/api/students/<int:student_db_id>', methods=['PUT'])
 def update_student(student_db_id):
     """Update a student"""
@@ -188,6 +357,7 @@ def update_student(student_db_id):
                 return jsonify({'success': False, 'error': f'Student ID "{data["student_id"]}" already exists'}), 400
             
             student.student_id = data['student_id']
+            invalidate_course_rosters()
             
         if 'name' in data:
             student.name = data['name']
@@ -228,6 +398,7 @@ def delete_student(student_db_id):
         
         db.delete(student)
         db.commit()
+        invalidate_course_rosters()
 
         return jsonify({'success': True})
     except Exception as e:
@@ -253,6 +424,8 @@ def bulk_import_students():
     course_id = request.form.get('course_id')
     
     try:
+        import pandas as pd
+
         # Read Excel file
         df = pd.read_excel(file)
         
@@ -335,6 +508,8 @@ def bulk_import_students():
                 errors.append(f"Row {index + 2}: {str(e)}")
         
         db.commit()
+        if course:
+            invalidate_course_rosters(course.id)
         
         message = f'Successfully imported {imported} students'
         if enrolled > 0:
@@ -359,6 +534,8 @@ def bulk_import_students():
 def export_template():
     """Download Excel template for bulk import"""
     try:
+        import pandas as pd
+
         # Create sample DataFrame
         df = pd.DataFrame({
             'Student ID': ['STU001', 'STU002', 'STU003'],
@@ -542,34 +719,26 @@ def mark_attendance():
         return jsonify({'success': False, 'error': 'No image provided'}), 400
 
     try:
-        # Save temporary image
+        # Decode uploaded image in memory
         image_file = request.files['image']
-        temp_path = Config.UPLOAD_FOLDER / 'temp' / f"temp_{datetime.now().timestamp()}.jpg"
-        temp_path.parent.mkdir(parents=True, exist_ok=True)
-        image_file.save(str(temp_path))
+        image_bytes = np.frombuffer(image_file.read(), dtype=np.uint8)
+        frame = cv2.imdecode(image_bytes, cv2.IMREAD_COLOR)
 
-        # Read image
-        frame = cv2.imread(str(temp_path))
+        if frame is None:
+            return jsonify({'success': False, 'error': 'Invalid image'}), 400
 
-        # Detect faces
-        faces = face_detector.detect_faces(frame)
+        # Detect faces and recognize them in one batch
+        faces, results = run_inference('analyze', frame, None)
 
         if not faces:
             return jsonify({'success': False, 'error': 'No faces detected'}), 400
 
         db = next(get_db())
         marked_students = []
+        face_imgs = [FaceDetector.extract_face(frame, bbox) for bbox in faces]
 
         # Process each detected face
-        for i, bbox in enumerate(faces):
-            # Extract face
-            face_img = face_detector.extract_face(frame, bbox)
-            face_path = Config.UPLOAD_FOLDER / 'temp' / f"face_{datetime.now().timestamp()}_{i}.jpg"
-            cv2.imwrite(str(face_path), face_img)
-
-            # Recognize face
-            student_id, confidence = face_recognizer.recognize_face(face_path)
-
+        for i, (face_img, (student_id, confidence)) in enumerate(zip(face_imgs, results)):
             if student_id:
                 # Get student from database
                 student = db.query(Student).filter(Student.student_id == student_id).first()
@@ -587,7 +756,7 @@ def mark_attendance():
                         attendance = Attendance(
                             student_id=student.id,
                             confidence=f"{confidence:.2%}",
-                            image_path=str(face_path)
+                            image_path=save_evidence_image(face_img, f"face_{i}")
                         )
                         db.add(attendance)
                         marked_students.append({
@@ -607,12 +776,23 @@ def mark_attendance():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def detect_stream_faces(camera_index, frame, backend):
+    """
+    Detect faces in a live stream frame, batched with the other cameras when enabled
+
+    Returns:
+        Structured detections (face_detector.DETECTION_DTYPE) with boxes, scores and landmarks
+    """
+    scheduler = get_detection_scheduler(backend)
+    if scheduler:
+        return scheduler.detect(camera_index, frame, timeout=Config.INFERENCE_TIMEOUT)
+    return run_inference('detect_arrays', [frame], backend)[0]
+
 def generate_frames(camera_index=None, course_id=None, week_number=None):
     """Generate video frames for live stream with automatic face detection"""
-    global last_detected_students
-    cam = get_camera(camera_index)
+    capture = get_camera_capture(camera_index)
 
-    if cam is None:
+    if capture is None:
         # Return error frame if camera not available
         error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
         cv2.putText(error_frame, f'Camera {camera_index} not available', (50, 240),
@@ -623,126 +803,246 @@ def generate_frames(camera_index=None, course_id=None, week_number=None):
                b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
         return
 
+    backend = camera_backend(camera_index)
+    scheduler = get_detection_scheduler(backend)
+    if scheduler:
+        scheduler.register(camera_index)
+    capture.open()
+    try:
+        yield from _stream_frames(capture, camera_index, course_id, week_number, backend)
+    finally:
+        capture.close()
+        if scheduler:
+            scheduler.unregister(camera_index)
+
+def resolve_stream_course(db, course_id):
+    """Course of a live stream session and its roster (None, None if no session)"""
+    if course_id:
+        # Use selected course from UI
+        active_course = db.query(Course).filter(Course.id == int(course_id)).first()
+    else:
+        # Auto-detect based on current time (legacy behavior)
+        active_course = get_active_course(db)
+    candidates = get_course_roster(db, active_course.id) if active_course else None
+    return active_course, candidates
+
+def mark_stream_attendance(student_id, confidence, face_img, active_course, week_number):
+    """
+    Mark attendance for a student recognized in a live stream
+
+    Args:
+        student_id: Recognized student ID
+        confidence: Recognition confidence
+        face_img: Face crop saved as evidence
+        active_course: Course of the session, or None
+        week_number: Optional week number of the session
+
+    Returns:
+        Label to draw next to the face
+    """
+    # Check if already detected recently (within 30 seconds)
+    current_time = datetime.now()
+    if student_id in last_detected_students:
+        last_seen = last_detected_students[student_id]
+        if (current_time - last_seen).seconds < 30:
+            # Get student name for label
+            db = next(get_db())
+            student = db.query(Student).filter(Student.student_id == student_id).first()
+            student_name = student.name if student else student_id
+            return f"{student_name} (Recent)"
+
+    # Mark attendance automatically with course schedule check
+    try:
+        db = next(get_db())
+        student = db.query(Student).filter(Student.student_id == student_id).first()
+        print(f"Database lookup: student_id={student_id}, student_found={student is not None}")
+
+        if not student:
+            return "Unknown"
+
+        print(f"Student found: {student.name} (ID: {student.student_id})")
+        if not active_course:
+            # No active course selected or detected
+            last_detected_students[student_id] = current_time
+            return f"{student.name} (No Session)"
+
+        # Check if student is enrolled in this course
+        enrollment = db.query(CourseEnrollment).filter(
+            CourseEnrollment.student_id == student.id,
+            CourseEnrollment.course_id == active_course.id
+        ).first()
+
+        if not enrollment:
+            # Student not enrolled in this course
+            last_detected_students[student_id] = current_time
+            return f"{student.name} (Not Enrolled)"
+
+        # Check if already marked for THIS COURSE today
+        today = current_time.date()
+        existing = db.query(Attendance).filter(
+            Attendance.student_id == student.id,
+            Attendance.course_id == active_course.id,
+            Attendance.timestamp >= datetime.combine(today, datetime.min.time())
+        ).first()
+
+        if existing:
+            last_detected_students[student_id] = current_time
+            return f"{student.name} (Done)"
+
+        # Mark attendance for this specific course
+        attendance = Attendance(
+            student_id=student.id,
+            course_id=active_course.id,
+            confidence=f"{confidence:.2%}",
+            image_path=save_evidence_image(face_img, "detect"),
+            week_number=week_number
+        )
+        db.add(attendance)
+        db.commit()
+
+        # Update last detected time
+        last_detected_students[student_id] = current_time
+        print(f"✓ Attendance marked: {student.name} for {active_course.course_code} ({confidence:.2%})")
+        return f"{student.name} ✓"
+    except Exception as e:
+        print(f"Error marking attendance: {e}")
+        return "Error"
+
+def track_frame(frame, detections, frame_count, tracker, course_id, week_number, backend):
+    """
+    Track the detected faces of a frame, recognizing only tracks that need it
+
+    Args:
+        frame: Camera frame
+        detections: Structured detections of the frame (or reused from the last detected frame)
+        frame_count: Index of the frame in the stream
+        tracker: FaceTracker of the stream
+        course_id: Course selected in the UI, or None to auto-detect
+        week_number: Optional week number of the session
+        backend: Detector backend of the camera
+
+    Returns:
+        Frame with the tracked faces and their carried-over labels drawn
+    """
+    tracks = tracker.update(detections[['x1', 'y1', 'x2', 'y2']].tolist(), frame_count, detections['score'])
+
+    # Score every tracked crop so the sharpest, most frontal one of each
+    # window is the one recognized
+    for track in tracks:
+        face_img = FaceDetector.extract_face(frame, track.detection)
+        quality = score_face(face_img, detections['landmarks'][track.detection_index])
+        tracker.offer(track, face_img, quality, frame_count)
+
+    due = []
+    for track in tracker.due(tracks, frame_count):
+        if track.best_score < Config.FACE_QUALITY_MIN_SCORE:
+            tracker.skip(track, frame_count)
+        else:
+            due.append(track)
+    if due:
+        # Resolve the session only when a track needs recognition
+        db = next(get_db())
+        active_course, candidates = resolve_stream_course(db, course_id)
+        face_imgs = [track.best_crop for track in due]
+        try:
+            results = run_inference('recognize', face_imgs, candidates, backend in FACE_BACKENDS)
+        except Exception as e:
+            print(f"Inference error: {e}")
+            results = [(None, 0)] * len(due)
+
+        for track, face_img, (student_id, confidence) in zip(due, face_imgs, results):
+            print(f"Face recognition result: track={track.track_id}, student_id={student_id}, "
+                  f"confidence={confidence}, quality={track.best_score:.2f}")
+            tracker.record(track, student_id, confidence, frame_count)
+            if student_id:
+                track.label = mark_stream_attendance(student_id, confidence, face_img, active_course, week_number)
+            elif track.student_id is None:
+                track.label = "Unknown"
+
+    return FaceDetector.draw_faces(frame, [track.box for track in tracks], [track.label or "" for track in tracks])
+
+def _stream_frames(capture, camera_index, course_id, week_number, backend):
+    """Analyze and encode the newest frames of a camera's capture thread"""
     frame_count = 0
+    sequence = 0
+    tracker = None
+    if Config.TRACKING_ENABLED:
+        tracker = FaceTracker(Config.TRACK_IOU_THRESHOLD, Config.TRACK_MAX_AGE, Config.TRACK_HIGH_SCORE,
+                              Config.TRACK_RETRY_FRAMES, Config.TRACK_REVERIFY_FRAMES, Config.QUALITY_WINDOW_FRAMES)
+        stream_trackers[camera_index] = tracker
+    gate = None
+    if Config.MOTION_GATE_ENABLED:
+        gate = MotionGate(Config.MOTION_THRESHOLD, Config.MOTION_PIXEL_THRESHOLD, Config.MOTION_GATE_WIDTH,
+                          Config.MOTION_MAX_SKIP_FRAMES)
+        stream_motion_gates[camera_index] = gate
+    scheduler = get_detection_scheduler(backend)
+    idle = False
+    detected_count = 0
+    detections = np.zeros(0, dtype=DETECTION_DTYPE)
+    faces, labels = [], []
 
     while True:
-        success, frame = cam.read()
-        if not success:
+        # Always take the newest frame; ones captured while this one was
+        # processed are dropped instead of queueing up behind it
+        sequence, frame = capture.read(sequence, timeout=Config.CAPTURE_TIMEOUT)
+        if frame is None:
             break
 
-        # Process every 10th frame for face recognition (performance optimization)
-        if frame_count % 10 == 0:
-            # Detect faces
-            faces = face_detector.detect_faces(frame)
+        # Frames where nothing moved reuse the previous boxes instead of running YOLO
+        detect = gate is None or gate.check(frame)
+        if scheduler and idle == detect:
+            idle = not detect
+            scheduler.set_idle(camera_index, idle)
+
+        if tracker:
+            if detect:
+                try:
+                    detections = detect_stream_faces(camera_index, frame, backend)
+                except Exception as e:
+                    print(f"Inference error: {e}")
+                    detections = np.zeros(0, dtype=DETECTION_DTYPE)
+            # Identities carry over between frames; recognition runs for new,
+            # unresolved or re-verified tracks only
+            frame = track_frame(frame, detections, frame_count, tracker, course_id, week_number, backend)
+        elif not detect:
+            frame = FaceDetector.draw_faces(frame, faces, labels)
+        # Process every 10th detected frame for face recognition (performance optimization)
+        elif detected_count % 10 == 0:
+            # Resolve the session once per cycle so recognition only searches its roster
+            db = next(get_db())
+            active_course, candidates = resolve_stream_course(db, course_id)
+
+            # Detect and recognize all faces in the frame with one batched pass (crops stay in memory)
+            try:
+                faces, results = run_inference('analyze', frame, candidates, backend)
+            except Exception as e:
+                print(f"Inference error: {e}")
+                faces, results = [], []
+            face_imgs = [FaceDetector.extract_face(frame, bbox) for bbox in faces]
 
-            # Try to recognize each face
             labels = []
-            for bbox in faces:
-                # Extract and save face temporarily
-                face_img = face_detector.extract_face(frame, bbox)
-                if face_img.size == 0:
-                    labels.append("Unknown")
-                    continue
-
-                # Save temporarily for recognition
-                temp_path = Config.UPLOAD_FOLDER / 'temp' / f"detect_{datetime.now().timestamp()}.jpg"
-                temp_path.parent.mkdir(parents=True, exist_ok=True)
-                cv2.imwrite(str(temp_path), face_img)
-
-                # Recognize
-                student_id, confidence = face_recognizer.recognize_face(temp_path)
+            for face_img, (student_id, confidence) in zip(face_imgs, results):
                 print(f"Face recognition result: student_id={student_id}, confidence={confidence}")
 
                 if student_id:
-                    # Check if already detected recently (within 30 seconds)
-                    current_time = datetime.now()
-                    if student_id in last_detected_students:
-                        last_seen = last_detected_students[student_id]
-                        if (current_time - last_seen).seconds < 30:
-                            # Get student name for label
-                            db = next(get_db())
-                            student = db.query(Student).filter(Student.student_id == student_id).first()
-                            student_name = student.name if student else student_id
-                            labels.append(f"{student_name} (Recent)")
-                            continue
-
-                    # Mark attendance automatically with course schedule check
-                    try:
-                        db = next(get_db())
-                        student = db.query(Student).filter(Student.student_id == student_id).first()
-                        print(f"Database lookup: student_id={student_id}, student_found={student is not None}")
-
-                        if student:
-                            print(f"Student found: {student.name} (ID: {student.student_id})")
-                            # Use provided course_id or auto-detect based on time
-                            if course_id:
-                                # Use selected course from UI
-                                active_course = db.query(Course).filter(Course.id == int(course_id)).first()
-                            else:
-                                # Auto-detect based on current time (legacy behavior)
-                                active_course = get_active_course(db)
-
-                            if not active_course:
-                                # No active course selected or detected
-                                labels.append(f"{student.name} (No Session)")
-                                last_detected_students[student_id] = current_time
-                                continue
-
-                            # Check if student is enrolled in this course
-                            enrollment = db.query(CourseEnrollment).filter(
-                                CourseEnrollment.student_id == student.id,
-                                CourseEnrollment.course_id == active_course.id
-                            ).first()
-
-                            if not enrollment:
-                                # Student not enrolled in this course
-                                labels.append(f"{student.name} (Not Enrolled)")
-                                last_detected_students[student_id] = current_time
-                                continue
-
-                            # Check if already marked for THIS COURSE today
-                            today = current_time.date()
-                            existing = db.query(Attendance).filter(
-                                Attendance.student_id == student.id,
-                                Attendance.course_id == active_course.id,
-                                Attendance.timestamp >= datetime.combine(today, datetime.min.time())
-                            ).first()
-
-                            if not existing:
-                                # Mark attendance for this specific course
-                                attendance = Attendance(
-                                    student_id=student.id,
-                                    course_id=active_course.id,
-                                    confidence=f"{confidence:.2%}",
-                                    image_path=str(temp_path),
-                                    week_number=week_number
-                                )
-                                db.add(attendance)
-                                db.commit()
-
-                                # Update last detected time
-                                last_detected_students[student_id] = current_time
-                                labels.append(f"{student.name} ✓")
-                                print(f"✓ Attendance marked: {student.name} for {active_course.course_code} ({confidence:.2%})")
-                            else:
-                                labels.append(f"{student.name} (Done)")
-                                last_detected_students[student_id] = current_time
-                        else:
-                            labels.append("Unknown")
-                    except Exception as e:
-                        print(f"Error marking attendance: {e}")
-                        labels.append("Error")
+                    labels.append(mark_stream_attendance(student_id, confidence, face_img, active_course, week_number))
                 else:
                     labels.append("Unknown")
 
             # Draw bounding boxes with labels
-            frame = face_detector.draw_faces(frame, faces, labels)
+            frame = FaceDetector.draw_faces(frame, faces, labels)
         else:
             # Just detect and draw boxes (no recognition)
-            faces = face_detector.detect_faces(frame)
-            frame = face_detector.draw_faces(frame, faces)
+            try:
+                faces = detect_stream_faces(camera_index, frame, backend)[['x1', 'y1', 'x2', 'y2']].tolist()
+            except Exception as e:
+                print(f"Inference error: {e}")
+                faces = []
+            labels = []
+            frame = FaceDetector.draw_faces(frame, faces)
 
         frame_count += 1
+        detected_count += detect
 
         # Encode frame
         ret, buffer = cv2.imencode('.jpg', frame)
@@ -899,6 +1199,7 @@ def create_enrollment():
         db.add(enrollment)
         db.commit()
         db.refresh(enrollment)
+        invalidate_course_rosters(enrollment.course_id)
 
         return jsonify({'success': True, 'enrollment': enrollment.to_dict()}), 201
     except Exception as e:
@@ -915,8 +1216,10 @@ def delete_enrollment(enrollment_id):
         if not enrollment:
             return jsonify({'success': False, 'error': 'Enrollment not found'}), 404
 
+        course_id = enrollment.course_id
         db.delete(enrollment)
         db.commit()
+        invalidate_course_rosters(course_id)
         return jsonify({'success': True, 'message': 'Enrollment deleted successfully'})
     except Exception as e:
         db.rollback()
@@ -1025,6 +1328,93 @@ def export_attendance():
 
     return response
 
+@app.route('/api/recognize', methods=['POST'])
+def recognize():
+    """Identify the faces of an uploaded image without marking attendance"""
+    if 'image' not in request.files:
+        return jsonify({'success': False, 'error': 'No image provided'}), 400
+
+    try:
+        k = int(request.form.get('k', Config.RECOGNITION_TOP_K))
+        if not 1 <= k <= Config.RECOGNITION_MAX_TOP_K:
+            return jsonify({'success': False, 'error': f'k must be between 1 and {Config.RECOGNITION_MAX_TOP_K}'}), 400
+
+        image_bytes = np.frombuffer(request.files['image'].read(), dtype=np.uint8)
+        frame = cv2.imdecode(image_bytes, cv2.IMREAD_COLOR)
+        if frame is None:
+            return jsonify({'success': False, 'error': 'Invalid image'}), 400
+
+        # Optionally restrict the search to the students enrolled in a course
+        candidates = None
+        course_id = request.form.get('course_id')
+        if course_id:
+            db = next(get_db())
+            try:
+                candidates = get_course_roster(db, int(course_id))
+            finally:
+                db.close()
+
+        boxes = run_inference('detect', frame)
+        crops = [FaceDetector.extract_face(frame, box) for box in boxes]
+        tight_boxes = Config.DETECTOR_BACKEND in FACE_BACKENDS
+        results = run_inference('recognize_top_k', crops, candidates, k, tight_boxes) if crops else []
+
+        faces = []
+        for box, result in zip(boxes, results):
+            x1, y1, x2, y2 = box
+            faces.append({
+                'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)},
+                **result
+            })
+        return jsonify({'success': True, 'faces': faces, 'threshold': Config.FACE_RECOGNITION_THRESHOLD})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness and model readiness"""
+    if inference_pool:
+        health = {
+            'status': 'ok',
+            'ready': inference_pool.ready,
+            'inference': inference_pool.status()
+        }
+    else:
+        models = {model.name: model.status() for model in face_detectors.values()}
+        models['face_recognizer'] = face_recognizer.status()
+        health = {
+            'status': 'ok',
+            'ready': all(model['ready'] for model in models.values()),
+            'models': models
+        }
+    if detection_schedulers:
+        health['camera_batching'] = {
+            backend: scheduler.status() for backend, scheduler in detection_schedulers.items()
+        }
+    return jsonify(health)
+
+@app.route('/api/recognition/stats', methods=['GET'])
+def recognition_stats():
+    """Get recognition pipeline statistics"""
+    if inference_pool:
+        # Recognition runs in the workers; report the pool instead
+        stats = {'success': True, 'ready': inference_pool.ready, 'inference': inference_pool.status()}
+    elif not face_recognizer.ready:
+        stats = {'success': True, 'ready': False}
+    else:
+        stats = {
+            'success': True,
+            'ready': True,
+            'enhancement': face_recognizer.get_enhancement_stats()
+        }
+
+    # Capture, tracking and motion gating run in this process for every live stream
+    stats['tracking'] = {camera: tracker.status() for camera, tracker in stream_trackers.items()}
+    stats['motion_gate'] = {camera: gate.status() for camera, gate in stream_motion_gates.items()}
+    stats['capture'] = {camera: capture.status() for camera, capture in camera_captures.items()}
+    return jsonify(stats)
+
 @app.route('/api/video_feed')
 def video_feed():
     """Video streaming route with automatic attendance marking"""
@@ -1038,5 +1428,9 @@ if __name__ == '__main__':
     # Initialize database
     init_db()
 
+    # Load face models in the background while the server starts
+    if Config.MODEL_WARMUP:
+        start_model_warmup()
+
     # Run Flask app
     app.run(host='0.0.0.0', port=5001, debug=Config.DEBUG)
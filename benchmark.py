@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Benchmark recognition pipeline settings
+
+Usage:
+    python benchmark.py alignment [--images DIR] [--limit N]
+    python benchmark.py embedding [--images DIR] [--limit N] [--batch-size N]
+    python benchmark.py gallery [--students N] [--per-student N] [--queries N]
+    python benchmark.py detection [--camera INDEX | --images DIR] [--frames N] [--min-recall R]
+    python benchmark.py detectors [--camera INDEX | --images DIR] [--frames N] [--backends a,b] [--runtimes a,b]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import Config
+
+
+def load_images(images_dir, limit):
+    """Load up to `limit` face images (jpg/png) from a directory tree"""
+    paths = sorted(
+        p for p in Path(images_dir).rglob('*')
+        if p.suffix.lower() in ('.jpg', '.jpeg', '.png')
+    )
+    images = []
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is not None:
+            images.append(image)
+        if len(images) >= limit:
+            break
+    return images
+
+
+def benchmark_alignment(args):
+    """Per-face latency with and without DeepFace's second face detection"""
+    from face_embedder import FaceEmbedder
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"No images found in {args.images}")
+        return
+
+    embedder = FaceEmbedder()
+    embedder.embed([embedder.preprocess(images[0], detector_backend='skip')])  # warm-up
+
+    print("=" * 60)
+    print(f"Alignment benchmark: {len(images)} face crops, model {embedder.model_name}")
+    print("=" * 60)
+
+    embeddings = {}
+    for label, backend in (("detect (opencv)", 'opencv'), ("box (skip)", 'skip')):
+        start = time.perf_counter()
+        faces = [embedder.preprocess(image, detector_backend=backend) for image in images]
+        preprocess_ms = (time.perf_counter() - start) * 1000 / len(images)
+
+        start = time.perf_counter()
+        embeddings[backend] = embedder.embed(faces)
+        embed_ms = (time.perf_counter() - start) * 1000 / len(images)
+
+        print(f"{label:<18} preprocess {preprocess_ms:7.2f} ms/face   "
+              f"embed {embed_ms:7.2f} ms/face   total {preprocess_ms + embed_ms:7.2f} ms/face")
+
+    a = embeddings['opencv'] / np.linalg.norm(embeddings['opencv'], axis=1, keepdims=True)
+    b = embeddings['skip'] / np.linalg.norm(embeddings['skip'], axis=1, keepdims=True)
+    distances = 1 - np.sum(a * b, axis=1)
+    print("-" * 60)
+    print(f"Cosine distance between modes: mean {distances.mean():.3f}, max {distances.max():.3f}")
+    print("(large values mean the crops are not tight face boxes; keep FACE_ALIGNMENT_MODE=detect)")
+
+
+def benchmark_embedding(args):
+    """Per-face latency and parity of the TensorFlow and ONNX Runtime embedding backends"""
+    from face_embedder import FaceEmbedder
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"No images found in {args.images}")
+        return
+
+    reference = FaceEmbedder(backend='tensorflow', batch_size=args.batch_size)
+    faces = np.asarray([reference.preprocess(image) for image in images], dtype=np.float32)
+
+    print("=" * 60)
+    print(f"Embedding benchmark: {len(faces)} faces, batch size {reference.batch_size}")
+    print("=" * 60)
+
+    backends = [("tensorflow", reference)]
+    for label, quantize in (("onnx float32", False), ("onnx int8", True)):
+        embedder = FaceEmbedder(batch_size=args.batch_size, backend='onnx', quantize=quantize)
+        if embedder.backend != 'onnx':
+            print(f"{label:<14} unavailable (see message above)")
+        elif quantize and not embedder.model.path.name.endswith('.int8.onnx'):
+            print(f"{label:<14} rejected by the parity check")
+        else:
+            backends.append((label, embedder))
+
+    for label, embedder in backends:
+        embedder.embed(faces[:1])  # warm-up
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            embedder.embed(faces)
+        per_face_ms = (time.perf_counter() - start) * 1000 / (len(faces) * args.repeat)
+
+        line = f"{label:<14} {per_face_ms:7.2f} ms/face"
+        if embedder is not reference:
+            parity = FaceEmbedder.parity_check(reference.embed, embedder.embed, faces)
+            line += (f"   distance to tensorflow: mean {parity['mean_distance']:.5f}, "
+                     f"max {parity['max_distance']:.5f} ({'ok' if parity['passed'] else 'FAIL'})")
+        print(line)
+    print("-" * 60)
+    print(f"Parity tolerance {Config.ONNX_PARITY_TOLERANCE}, ONNX threads {Config.ONNX_THREADS or 'auto'}")
+
+
+def synthetic_gallery(students, per_student, noise, dim=512, seed=0):
+    """
+    Synthetic enrolled embeddings: noisy views of one random identity vector per student
+
+    Returns:
+        Tuple of (identities, normalized embeddings grouped per student)
+    """
+    from face_gallery import FaceGallery
+
+    rng = np.random.default_rng(seed)
+    identities = FaceGallery.normalize(rng.standard_normal((students, dim), dtype=np.float32))
+    embeddings = np.empty((students * per_student, dim), dtype=np.float32)
+    for start in range(0, students, 10000):
+        block = np.repeat(identities[start:start + 10000], per_student, axis=0)
+        block += noise * rng.standard_normal(block.shape, dtype=np.float32)
+        embeddings[start * per_student:start * per_student + len(block)] = FaceGallery.normalize(block)
+    return identities, embeddings
+
+
+def legacy_bytes_per_student(embeddings, per_student, samples=200):
+    """Python heap used by the old face_encodings.pkl dict entry of one student"""
+    import tracemalloc
+
+    tracemalloc.start()
+    database = {}
+    for student in range(samples):
+        rows = embeddings[student * per_student:(student + 1) * per_student]
+        database[f"S{student:06d}"] = {
+            'embeddings': [row.tolist() for row in rows],
+            'embedding': rows[0].tolist(),
+            'image_path': f"data/student_faces/S{student:06d}.jpg"
+        }
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / samples
+
+
+def benchmark_gallery(args):
+    """Memory and accuracy of float32, float16 and int8 galleries on a synthetic gallery"""
+    from face_gallery import FaceGallery
+
+    per_student = args.per_student
+    identities, embeddings = synthetic_gallery(args.students, per_student, args.noise, seed=args.seed)
+    student_ids = list(range(args.students))
+    counts = [per_student] * args.students
+
+    def row_source(student_id):
+        return embeddings[student_id * per_student:(student_id + 1) * per_student]
+
+    rng = np.random.default_rng(args.seed + 1)
+    truth = rng.choice(args.students, args.queries)
+    queries = identities[truth] + args.noise * rng.standard_normal((args.queries, identities.shape[1]),
+                                                                   dtype=np.float32)
+
+    print("=" * 78)
+    print(f"Gallery benchmark: {args.students} students x {per_student} embeddings, {args.queries} queries")
+    print("=" * 78)
+    legacy = legacy_bytes_per_student(embeddings, per_student)
+    print(f"{'face_encodings.pkl dict (Python lists)':<32} {legacy * args.students / 2**20:9.1f} MB"
+          f"  {legacy / 1024:7.2f} KB/student  (estimated from 200 students)")
+    print("-" * 78)
+    print(f"{'representation':<32} {'memory':>12} {'per student':>12} {'top-1':>7} {'agree':>7} "
+          f"{'max err':>9} {'ms/query':>9}")
+
+    reference = None
+    for label, quantization, rerank in (("float32", 'none', False),
+                                        ("float16", 'float16', False),
+                                        ("float16 + exact re-rank", 'float16', True),
+                                        ("int8", 'int8', False),
+                                        ("int8 + exact re-rank", 'int8', True)):
+        gallery = FaceGallery.from_matrix(embeddings, student_ids, counts, quantization=quantization,
+                                          row_source=row_source if rerank else None,
+                                          rerank_candidates=args.rerank)
+        start = time.perf_counter()
+        results = [gallery.match(query) for query in queries]
+        ms_per_query = (time.perf_counter() - start) * 1000 / args.queries
+
+        matched = np.array([student_id for student_id, _ in results])
+        distances = np.array([distance for _, distance in results])
+        if reference is None:
+            reference = (matched, distances)
+        agree = np.mean(matched == reference[0])
+        max_error = np.max(np.abs(distances - reference[1]))
+        print(f"{label:<32} {gallery.nbytes / 2**20:9.1f} MB {gallery.nbytes / args.students / 1024:9.2f} KB "
+              f"{np.mean(matched == truth):7.3f} {agree:7.3f} {max_error:9.5f} {ms_per_query:9.2f}")
+    print("-" * 78)
+    print("agree / max err: same student / largest distance difference compared to float32")
+
+
+def capture_frames(camera_index, count, stride=5):
+    """Grab every stride-th frame of a camera until count frames are collected"""
+    camera = cv2.VideoCapture(camera_index)
+    camera.set(cv2.CAP_PROP_FRAME_WIDTH, Config.FRAME_WIDTH)
+    camera.set(cv2.CAP_PROP_FRAME_HEIGHT, Config.FRAME_HEIGHT)
+    frames = []
+    try:
+        read = 0
+        while camera.isOpened() and len(frames) < count:
+            success, frame = camera.read()
+            if not success:
+                break
+            if read % stride == 0:
+                frames.append(frame)
+            read += 1
+    finally:
+        camera.release()
+    return frames
+
+
+def benchmark_detection(args):
+    """Detection FPS against recall for each YOLO input size, and the smallest size to use"""
+    from face_detector import FaceDetector
+
+    if args.images:
+        frames = load_images(args.images, args.frames)
+    else:
+        print(f"Capturing {args.frames} frames from camera {args.camera}...")
+        frames = capture_frames(args.camera, args.frames)
+    if not frames:
+        print("No frames to benchmark")
+        return
+
+    detector = FaceDetector()
+    sizes = [int(size) for size in args.sizes.split(',')] if args.sizes else None
+    report = detector.tune_detection_size(frames, sizes, args.min_recall)
+
+    height, width = frames[0].shape[:2]
+    print("=" * 60)
+    print(f"Detection benchmark: {len(frames)} frames ({width}x{height}), "
+          f"{report['reference_faces']} faces at full resolution")
+    print("=" * 60)
+    print(f"{'size':>6} {'recall':>8} {'FPS':>8}")
+    for result in report['results']:
+        marker = "  <- smallest with recall >= {:.2f}".format(args.min_recall) if result['size'] == report['size'] else ""
+        print(f"{result['size']:>6} {result['recall']:8.3f} {result['fps']:8.1f}{marker}")
+    print("-" * 60)
+    if report['reference_faces'] == 0:
+        print("No faces found at full resolution; capture frames with people at their usual distance")
+    print(f"Recommended: DETECTION_SIZE={report['size']} (current {Config.DETECTION_SIZE})")
+
+
+def benchmark_detectors(args):
+    """Load time and per-frame latency of each detector backend/runtime and the embedding cost of its crops"""
+    from face_detector import FaceDetector, DETECTOR_BACKENDS
+    from face_embedder import FaceEmbedder
+
+    if args.images:
+        frames = load_images(args.images, args.frames)
+    else:
+        print(f"Capturing {args.frames} frames from camera {args.camera}...")
+        frames = capture_frames(args.camera, args.frames)
+    if not frames:
+        print("No frames to benchmark")
+        return
+
+    embedder = FaceEmbedder()
+    height, width = frames[0].shape[:2]
+    print("=" * 90)
+    print(f"Detector benchmark: {len(frames)} frames ({width}x{height}), DETECTION_SIZE={Config.DETECTION_SIZE}")
+    print("=" * 90)
+    print(f"{'backend':<24} {'load s':>7} {'detect ms':>10} {'faces':>7} {'crop px':>9} {'embed ms':>10} "
+          f"{'total ms':>10} {'landmarks':>10}")
+
+    runs = []
+    for backend in (args.backends.split(',') if args.backends else DETECTOR_BACKENDS):
+        if backend == 'yunet':
+            runs.append((backend, None, None))
+            continue
+        for runtime in args.runtimes.split(','):
+            runs.append((backend, runtime, None))
+            if runtime == 'onnx' and args.int8:
+                runs.append((backend, runtime, True))
+
+    for backend, runtime, quantize in runs:
+        label = backend + (f" ({runtime}{' int8' if quantize else ''})" if runtime else "")
+        try:
+            start = time.perf_counter()
+            detector = FaceDetector(backend, runtime=runtime, quantize=quantize or False)
+            load_seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"{label:<24} unavailable: {e}")
+            continue
+
+        detector.detect_batch(frames[:1])  # warm-up
+        start = time.perf_counter()
+        detections = [detector.detect_batch([frame])[0] for frame in frames]
+        detect_ms = (time.perf_counter() - start) * 1000 / len(frames)
+
+        crops = [detector.extract_face(frame, box)
+                 for frame, found in zip(frames, detections)
+                 for box in found[['x1', 'y1', 'x2', 'y2']].tolist()]
+        crops = [crop for crop in crops if crop.size]
+        # Person crops need DeepFace to find the face again; face crops are embedded directly
+        crop_detector = 'skip' if detector.tight_boxes else None
+        start = time.perf_counter()
+        if crops:
+            embedder.embed([embedder.preprocess(crop, detector_backend=crop_detector) for crop in crops])
+        embed_ms = (time.perf_counter() - start) * 1000 / len(frames)
+
+        crop_pixels = np.mean([crop.shape[0] * crop.shape[1] for crop in crops]) if crops else 0
+        with_landmarks = sum(int(np.isfinite(found['landmarks']).all(axis=(1, 2)).sum()) for found in detections)
+        print(f"{label:<24} {load_seconds:7.2f} {detect_ms:10.2f} {len(crops) / len(frames):7.2f} {crop_pixels:9.0f} "
+              f"{embed_ms:10.2f} {detect_ms + embed_ms:10.2f} {with_landmarks:>10}")
+    print("-" * 90)
+    print("ms are per frame; embed = crop preprocessing + Facenet512 for all faces of the frame")
+    print("load s includes a first-time ONNX export; run twice to see the cached startup time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendify recognition benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    alignment = subparsers.add_parser('alignment', help="Second face detection vs trusting the box")
+    alignment.add_argument('--images', default=str(Config.UPLOAD_FOLDER),
+                           help="Directory of face crops (default: enrolled student faces)")
+    alignment.add_argument('--limit', type=int, default=200, help="Maximum images to use")
+    alignment.set_defaults(func=benchmark_alignment)
+
+    embedding = subparsers.add_parser('embedding', help="TensorFlow vs ONNX Runtime (float32 / int8) embedding")
+    embedding.add_argument('--images', default=str(Config.UPLOAD_FOLDER),
+                           help="Directory of face images (default: enrolled student faces)")
+    embedding.add_argument('--limit', type=int, default=64, help="Maximum images to use")
+    embedding.add_argument('--batch-size', type=int, default=None, help="Faces per forward pass")
+    embedding.add_argument('--repeat', type=int, default=3, help="Timed passes over all faces")
+    embedding.set_defaults(func=benchmark_embedding)
+
+    gallery = subparsers.add_parser('gallery', help="Memory/accuracy of quantized galleries (synthetic data)")
+    gallery.add_argument('--students', type=int, default=100000, help="Synthetic students")
+    gallery.add_argument('--per-student', type=int, default=2, help="Embeddings per student (original + enhanced)")
+    gallery.add_argument('--queries', type=int, default=200, help="Recognition queries")
+    gallery.add_argument('--noise', type=float, default=0.03,
+                         help="Per-dimension noise of each view (0.03 gives ~0.3 same-person cosine distance)")
+    gallery.add_argument('--rerank', type=int, default=Config.GALLERY_RERANK_CANDIDATES,
+                         help="Students re-ranked exactly per face")
+    gallery.add_argument('--seed', type=int, default=0, help="Random seed")
+    gallery.set_defaults(func=benchmark_gallery)
+
+    detection = subparsers.add_parser('detection', help="YOLO input size: FPS vs recall, and auto-tuned size")
+    detection.add_argument('--camera', type=int, default=Config.CAMERA_INDEX, help="Camera to capture frames from")
+    detection.add_argument('--images', default=None, help="Directory of frames to use instead of a camera")
+    detection.add_argument('--frames', type=int, default=50, help="Frames to use")
+    detection.add_argument('--sizes', default=None, help="Comma-separated sizes (default 160,224,320,416,512,640)")
+    detection.add_argument('--min-recall', type=float, default=0.95,
+                           help="Recall relative to full resolution the chosen size must reach")
+    detection.set_defaults(func=benchmark_detection)
+
+    detectors = subparsers.add_parser('detectors', help="Detector backends: latency and downstream embedding cost")
+    detectors.add_argument('--camera', type=int, default=Config.CAMERA_INDEX, help="Camera to capture frames from")
+    detectors.add_argument('--images', default=None, help="Directory of frames to use instead of a camera")
+    detectors.add_argument('--frames', type=int, default=30, help="Frames to use")
+    detectors.add_argument('--backends', default=None, help="Comma-separated backends (default: all)")
+    detectors.add_argument('--runtimes', default='ultralytics,onnx', help="Comma-separated YOLO runtimes")
+    detectors.add_argument('--int8', action='store_true', help="Also run the int8 ONNX model")
+    detectors.set_defaults(func=benchmark_detectors)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
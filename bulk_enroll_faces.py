@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Bulk face enrollment from a ZIP archive or folder laid out as <student_id>/*.jpg
+
+Students must already exist (e.g. via the Excel bulk import). Run it while the
+app is running or stopped; a running app picks up the new faces through the
+gallery hot reload.
+
+Usage:
+    python bulk_enroll_faces.py <folder-or-zip> [--failures-only]
+"""
+
+import sys
+from pathlib import Path
+from database import get_db
+from bulk_enrollment import bulk_enroll
+
+def enroll(source, failures_only=False):
+    """Enroll every image in source and print the per-file report"""
+    from face_recognizer import FaceRecognizer
+
+    db = next(get_db())
+    try:
+        print("Loading face recognition model...")
+        recognizer = FaceRecognizer()
+
+        print(f"Enrolling faces from {source}...")
+        result = bulk_enroll(db, source, recognizer.enroll_faces)
+
+        for entry in result['report']:
+            if entry['success'] and failures_only:
+                continue
+            status = "✓" if entry['success'] else "✗"
+            detail = "" if entry['success'] else f"  ({entry['error']})"
+            print(f"  {status} {entry['file']}{detail}")
+
+        print(f"\n✓ Files processed:    {result['files']}")
+        print(f"✓ Succeeded:          {result['succeeded']}")
+        print(f"✓ Failed:             {result['failed']}")
+        print(f"✓ Students enrolled:  {result['students_enrolled']}")
+        return result['succeeded'] > 0 or result['files'] == 0
+
+    except Exception as e:
+        db.rollback()
+        print(f"✗ Error during bulk enrollment: {e}")
+        return False
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) != 1 or not Path(args[0]).exists():
+        print(__doc__)
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Bulk face enrollment")
+    print("=" * 60)
+
+    success = enroll(args[0], failures_only='--failures-only' in sys.argv)
+
+    if success:
+        print("\n✓ Bulk enrollment completed!")
+        sys.exit(0)
+    else:
+        print("\n✗ Bulk enrollment failed!")
+        sys.exit(1)
@@ -0,0 +1,135 @@
+import uuid
+import zipfile
+from pathlib import Path, PurePosixPath
+
+from sqlalchemy import update
+from werkzeug.utils import secure_filename
+
+from config import Config
+from database import Student
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_enrollment_files(source):
+    """
+    List the images of a ZIP archive or directory laid out as <student_id>/*.jpg
+
+    The student ID is the name of the folder directly containing the image,
+    so an extra top-level folder (e.g. intake_2024/<student_id>/...) is fine.
+
+    Args:
+        source: Path to a directory or ZIP file, or a file object of a ZIP archive
+
+    Returns:
+        List of (student_id, name, read) tuples; read() returns the file bytes.
+        student_id is None for images that are not inside a folder.
+    """
+    files = []
+    if isinstance(source, (str, Path)) and Path(source).is_dir():
+        root = Path(source)
+        for path in sorted(root.rglob('*')):
+            if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS and not path.name.startswith('.'):
+                relative = path.relative_to(root)
+                student_id = relative.parent.name or None
+                files.append((student_id, str(relative), path.read_bytes))
+        return files
+
+    archive = zipfile.ZipFile(source)
+    for info in sorted(archive.infolist(), key=lambda info: info.filename):
+        path = PurePosixPath(info.filename)
+        if (info.is_dir() or path.suffix.lower() not in IMAGE_EXTENSIONS
+                or path.name.startswith('.') or '__MACOSX' in path.parts):
+            continue
+        student_id = path.parent.name or None
+        files.append((student_id, info.filename, lambda name=info.filename: archive.read(name)))
+    return files
+
+
+def stage_enrollment_images(files, students):
+    """
+    Copy images into each student's face folder so they can be enrolled
+
+    Every staged file gets a unique name, so images with the same file name
+    (from different folders of the archive, or an earlier import) never
+    overwrite each other.
+
+    Args:
+        files: Output of list_enrollment_files()
+        students: Dict of student_id -> Student for the known students
+
+    Returns:
+        Tuple of (items, report): items are (student_id, saved_path, name) tuples
+        for FaceRecognizer.enroll_faces, report lists the rejected files
+    """
+    items = []
+    report = []
+    for student_id, name, read in files:
+        if student_id is None:
+            report.append({'file': name, 'student_id': None, 'success': False,
+                           'error': 'Image is not inside a <student_id>/ folder'})
+            continue
+        if student_id not in students:
+            report.append({'file': name, 'student_id': student_id, 'success': False,
+                           'error': 'Student not found'})
+            continue
+
+        student_folder = Config.UPLOAD_FOLDER / student_id
+        student_folder.mkdir(parents=True, exist_ok=True)
+        image_name = secure_filename(f"{student_id}_{uuid.uuid4().hex[:12]}_{PurePosixPath(name).name}")
+        image_path = student_folder / image_name
+        try:
+            image_path.write_bytes(read())
+        except Exception as e:
+            report.append({'file': name, 'student_id': student_id, 'success': False, 'error': str(e)})
+            continue
+        items.append((student_id, image_path, name))
+    return items, report
+
+
+def bulk_enroll(db, source, enroll_faces):
+    """
+    Enroll every image of a ZIP archive or directory
+
+    Args:
+        db: Database session
+        source: Directory path, ZIP path or ZIP file object
+        enroll_faces: Callable taking a list of (student_id, image_path, name)
+            items and returning the per-file report (FaceRecognizer.enroll_faces)
+
+    Returns:
+        Dict with files, succeeded, failed, students_enrolled and the per-file report
+    """
+    files = list_enrollment_files(source)
+    student_ids = {student_id for student_id, _, _ in files if student_id}
+    students = {
+        student.student_id: student
+        for student in db.query(Student).filter(Student.student_id.in_(student_ids)).all()
+    } if student_ids else {}
+
+    items, report = stage_enrollment_images(files, students)
+    if items:
+        report.extend(enroll_faces(items))
+
+    # One UPDATE statement for all students with at least one enrolled image
+    saved_paths = {name: str(path) for _, path, name in items}
+    enrolled = {}
+    for entry in report:
+        if entry['success'] and entry['student_id'] not in enrolled:
+            enrolled[entry['student_id']] = saved_paths[entry['file']]
+    if enrolled:
+        db.execute(update(Student), [
+            {'id': students[student_id].id, 'face_encoding_path': path}
+            for student_id, path in enrolled.items()
+        ])
+        db.commit()
+
+    report.sort(key=lambda entry: entry['file'])
+    succeeded = sum(entry['success'] for entry in report)
+    return {
+        'files': len(report),
+        'succeeded': succeeded,
+        'failed': len(report) - succeeded,
+        'students_enrolled': len(enrolled),
+        'report': report
+    }
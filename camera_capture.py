@@ -0,0 +1,105 @@
+import collections
+import itertools
+import threading
+
+
+class CameraCapture:
+    def __init__(self, camera, buffer_size=2):
+        """
+        Read a camera on a background thread into a small ring buffer
+
+        Live streams analyze and encode every frame they take, which is
+        slower than the camera delivers them. Reading synchronously lets the
+        surplus pile up in the driver buffer, so the stream falls further and
+        further behind. The capture thread keeps draining the camera instead,
+        and readers always get the newest frame; frames nobody took before
+        newer ones arrived are counted as dropped.
+
+        Args:
+            camera: Opened cv2.VideoCapture
+            buffer_size: Number of most recent frames kept
+        """
+        self.camera = camera
+        self._frames = collections.deque(maxlen=max(1, buffer_size))
+        self._sequence = itertools.count(1)
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._running = False
+        self._thread = None
+        self._last_taken = 0
+        self.ended = False
+        self.stats = {'captured': 0, 'processed': 0, 'dropped': 0}
+
+    def open(self):
+        """Register a reader, starting the capture thread for the first one"""
+        with self._condition:
+            self._readers += 1
+            if self._running:
+                return
+            self._running = True
+            previous = self._thread
+            self._thread = threading.Thread(target=self._run, args=(previous,), name='camera-capture', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Unregister a reader; the capture thread stops when the last one leaves"""
+        with self._condition:
+            self._readers = max(0, self._readers - 1)
+            if self._readers == 0:
+                self._running = False
+
+    def read(self, after=0, timeout=None):
+        """
+        Newest frame captured after a given one
+
+        Args:
+            after: Sequence number of the reader's previous frame (0 for the first read)
+            timeout: Seconds to wait for a new frame (None waits until one arrives)
+
+        Returns:
+            (sequence, frame) with a private copy of the frame, or (after, None)
+            if the camera stopped delivering frames
+        """
+        with self._condition:
+            has_frame = lambda: self._frames and self._frames[-1][0] > after
+            if not self._condition.wait_for(lambda: has_frame() or self.ended, timeout) or not has_frame():
+                return after, None
+            sequence, frame = self._frames[-1]
+            if sequence > self._last_taken:
+                self.stats['processed'] += 1
+                self.stats['dropped'] += sequence - self._last_taken - 1
+                self._last_taken = sequence
+        # Several streams of one camera may draw on the frame they got
+        return sequence, frame.copy()
+
+    def status(self):
+        """Capture statistics: dropped frames are ones the streams were too slow to take"""
+        with self._condition:
+            captured = self.stats['captured']
+            return {
+                'running': self._running,
+                'ended': self.ended,
+                'readers': self._readers,
+                **self.stats,
+                'dropped_fraction': round(self.stats['dropped'] / captured, 3) if captured else None
+            }
+
+    def _run(self, previous):
+        """Grab frames until no reader is left or the camera fails"""
+        if previous is not None:
+            # A restarted capture must not read the camera alongside the old thread
+            previous.join()
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+            success, frame = self.camera.read()
+            with self._condition:
+                if not success:
+                    self.ended = True
+                    self._running = False
+                    self._condition.notify_all()
+                    return
+                self._frames.append((next(self._sequence), frame))
+                self.stats['captured'] += 1
+                self._condition.notify_all()
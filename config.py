@@ -24,18 +24,92 @@ class Config:
 
     # File Storage
     UPLOAD_FOLDER = BASE_DIR / 'data' / 'student_faces'
+    ATTENDANCE_PHOTOS_FOLDER = BASE_DIR / 'data' / 'attendance_photos'  # Evidence crops for marked attendance
     MODELS_FOLDER = BASE_DIR / 'models'
 
     # Create directories if they don't exist
     UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
+    ATTENDANCE_PHOTOS_FOLDER.mkdir(parents=True, exist_ok=True)
     MODELS_FOLDER.mkdir(parents=True, exist_ok=True)
 
     # Face Detection & Recognition Settings
+    MODEL_WARMUP = os.getenv('MODEL_WARMUP', 'True') == 'True'  # Load models in the background at startup instead of on first use
+    DETECTOR_BACKEND = os.getenv('DETECTOR_BACKEND', 'yolo_person')  # 'yolo_person' (COCO person boxes), 'yolo_face' (YOLO face weights) or 'yunet' (OpenCV face detector)
+    CAMERA_DETECTOR_BACKENDS = os.getenv('CAMERA_DETECTOR_BACKENDS', '')  # Per-camera overrides, e.g. "0:yunet,2:yolo_face"
     YOLO_MODEL = 'yolov8n.pt'  # YOLOv8 nano model for speed
+    YOLO_FACE_MODEL = os.getenv('YOLO_FACE_MODEL', 'yolov8n-face.pt')  # Face-trained YOLO weights in MODELS_FOLDER for 'yolo_face'
+    YUNET_MODEL = 'face_detection_yunet_2023mar.onnx'  # Downloaded to MODELS_FOLDER on first use of 'yunet'
+    DETECTION_SIZE = int(os.getenv('DETECTION_SIZE', '640'))  # Longest side of the downscaled frame YOLO sees, 0 = full frame at YOLO's default size (tune with benchmark.py detection)
     CONFIDENCE_THRESHOLD = 0.5
     FACE_RECOGNITION_THRESHOLD = 0.9  # DeepFace cosine distance threshold (higher = more lenient, works with multiple angles/lighting)
+    COURSE_ROSTER_TTL = float(os.getenv('COURSE_ROSTER_TTL', '30'))  # Seconds a cached course roster is trusted (enrollment changes in other workers)
+    RECOGNITION_TOP_K = int(os.getenv('RECOGNITION_TOP_K', '5'))  # Default number of candidates returned by /api/recognize
+    RECOGNITION_MAX_TOP_K = int(os.getenv('RECOGNITION_MAX_TOP_K', '50'))  # Largest k a client may request
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))  # Max face crops per Facenet512 forward pass
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'tensorflow')  # 'tensorflow' (DeepFace/Keras) or 'onnx' (ONNX Runtime on CPU)
+    ONNX_MODELS_FOLDER = MODELS_FOLDER / 'onnx'  # Exported ONNX models and their parity results
+    ONNX_QUANTIZE = os.getenv('ONNX_QUANTIZE', 'False') == 'True'  # Use the int8 dynamically quantized model if it passes the parity check
+    ONNX_THREADS = int(os.getenv('ONNX_THREADS', '0'))  # ONNX Runtime intra-op threads, 0 = one per core
+    ONNX_PARITY_TOLERANCE = float(os.getenv('ONNX_PARITY_TOLERANCE', '0.01'))  # Max cosine distance to the reference model's embeddings
+    DETECTOR_RUNTIME = os.getenv('DETECTOR_RUNTIME', 'ultralytics')  # YOLO backends: 'ultralytics' (PyTorch) or 'onnx' (ONNX Runtime, no torch needed once exported)
+    DETECTOR_ONNX_QUANTIZE = os.getenv('DETECTOR_ONNX_QUANTIZE', 'False') == 'True'  # Use the int8 detector if it keeps DETECTOR_ONNX_MIN_RECALL
+    DETECTOR_ONNX_THREADS = int(os.getenv('DETECTOR_ONNX_THREADS', '0'))  # ONNX Runtime intra-op threads for detection, 0 = one per core
+    DETECTOR_ONNX_MIN_RECALL = float(os.getenv('DETECTOR_ONNX_MIN_RECALL', '0.95'))  # Share of the original model's detections an export must find
+    FACE_ALIGNMENT_MODE = os.getenv('FACE_ALIGNMENT_MODE', 'detect')  # 'detect' (re-detect face inside each crop) or 'box' (trust detector box, skip second detection)
+    FACE_ENHANCEMENT_MODE = os.getenv('FACE_ENHANCEMENT_MODE', 'always')  # 'always' (embed CLAHE variant for every face) or 'adaptive' (only when needed)
+    FACE_ENHANCEMENT_BAND = float(os.getenv('FACE_ENHANCEMENT_BAND', '0.15'))  # Adaptive: enhance when best distance is within this margin of the threshold
+    FACE_MIN_BRIGHTNESS = 70  # Adaptive: mean gray level below this counts as poor lighting
+    FACE_MAX_BRIGHTNESS = 200  # Adaptive: mean gray level above this counts as washed out
+    FACE_MIN_CONTRAST = 30  # Adaptive: gray level std below this counts as flat lighting
+
+    # Inference Worker Pool Settings
+    INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '0'))  # Worker processes for detection/recognition, 0 = run inside the request thread
+    INFERENCE_QUEUE_SIZE = int(os.getenv('INFERENCE_QUEUE_SIZE', '32'))  # Maximum queued inference tasks
+    INFERENCE_MAX_BATCH = int(os.getenv('INFERENCE_MAX_BATCH', '8'))  # Maximum tasks a worker runs together
+    INFERENCE_BATCH_WAIT_MS = float(os.getenv('INFERENCE_BATCH_WAIT_MS', '5'))  # How long a worker waits to fill a batch
+    INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT', '30'))  # Seconds a request waits for a queue slot and for its result
+    CAMERA_BATCHING = os.getenv('CAMERA_BATCHING', 'True') == 'True'  # Run YOLO once for the latest frames of all live cameras
+    CAMERA_BATCH_WAIT_MS = float(os.getenv('CAMERA_BATCH_WAIT_MS', '15'))  # Longest a camera's frame waits for the other cameras' frames
+    TRACKING_ENABLED = os.getenv('TRACKING_ENABLED', 'True') == 'True'  # Track faces across frames and recognize each track once instead of every 10th frame
+    TRACK_IOU_THRESHOLD = float(os.getenv('TRACK_IOU_THRESHOLD', '0.3'))  # Minimum IoU between a track's predicted box and a detection
+    TRACK_MAX_AGE = int(os.getenv('TRACK_MAX_AGE', '30'))  # Frames a track survives without detections (e.g. brief occlusion)
+    TRACK_HIGH_SCORE = float(os.getenv('TRACK_HIGH_SCORE', '0.6'))  # Detections below this score only extend existing tracks
+    TRACK_RETRY_FRAMES = int(os.getenv('TRACK_RETRY_FRAMES', '10'))  # Frames between recognition attempts of an unrecognized track
+    TRACK_REVERIFY_FRAMES = int(os.getenv('TRACK_REVERIFY_FRAMES', '1800'))  # Frames after which a recognized track is re-verified (~1 min at 30 FPS)
+    QUALITY_WINDOW_FRAMES = int(os.getenv('QUALITY_WINDOW_FRAMES', '5'))  # Frames buffered per track before recognizing its best crop
+    FACE_QUALITY_MIN_SCORE = float(os.getenv('FACE_QUALITY_MIN_SCORE', '0.2'))  # Tracks whose best crop scores lower are not recognized yet
+    FACE_QUALITY_SHARPNESS_REF = float(os.getenv('FACE_QUALITY_SHARPNESS_REF', '100'))  # Laplacian variance (64x64 crop) counted as fully sharp
+    FACE_QUALITY_SIZE_REF = int(os.getenv('FACE_QUALITY_SIZE_REF', '80'))  # Crop side in pixels counted as full size
+    MOTION_GATE_ENABLED = os.getenv('MOTION_GATE_ENABLED', 'True') == 'True'  # Skip detection on live frames where nothing moved
+    MOTION_THRESHOLD = float(os.getenv('MOTION_THRESHOLD', '0.005'))  # Fraction of changed pixels that counts as motion
+    MOTION_PIXEL_THRESHOLD = int(os.getenv('MOTION_PIXEL_THRESHOLD', '25'))  # Gray-level difference that counts as a changed pixel
+    MOTION_GATE_WIDTH = int(os.getenv('MOTION_GATE_WIDTH', '160'))  # Width of the downsampled frames compared by the gate
+    MOTION_MAX_SKIP_FRAMES = int(os.getenv('MOTION_MAX_SKIP_FRAMES', '30'))  # Detection is forced after this many skipped frames (0 = never)
+
+    # Bulk Enrollment Settings
+    BULK_ENROLL_WORKERS = int(os.getenv('BULK_ENROLL_WORKERS', str(os.cpu_count() or 4)))  # Threads reading/preprocessing images
+    BULK_ENROLL_CHUNK = int(os.getenv('BULK_ENROLL_CHUNK', '64'))  # Images read and embedded per step (bounds memory)
+
+    # Gallery Search Settings
+    FACE_INDEX_MODE = os.getenv('FACE_INDEX_MODE', 'exact')  # 'exact' (brute force) or 'ivf' (approximate, for large galleries)
+    FACE_INDEX_NLIST = int(os.getenv('FACE_INDEX_NLIST', '0'))  # IVF clusters, 0 = auto (~4 * sqrt(embeddings))
+    FACE_INDEX_NPROBE = int(os.getenv('FACE_INDEX_NPROBE', '8'))  # Clusters searched per face (higher = better recall, slower)
+    FACE_INDEX_MIN_SIZE = int(os.getenv('FACE_INDEX_MIN_SIZE', '5000'))  # Use exact search below this many embeddings
+    FACE_INDEX_SAVE_INTERVAL = float(os.getenv('FACE_INDEX_SAVE_INTERVAL', '60'))  # Seconds between saves of a changed index (also saved at exit)
+
+    # Gallery Storage Settings
+    GALLERY_FOLDER = MODELS_FOLDER / 'gallery'  # Memory-mapped embedding store (replaces face_encodings.pkl)
+    GALLERY_STORE_DTYPE = os.getenv('GALLERY_STORE_DTYPE', 'float32')  # 'float32' (zero-copy load) or 'float16' (half the disk)
+    GALLERY_COMPACT_RATIO = 0.25  # Compact the store when dead/fragmented rows exceed this fraction
+    GALLERY_MAX_EMBEDDINGS = int(os.getenv('GALLERY_MAX_EMBEDDINGS', '10'))  # Per-student cap; re-enrollment beyond it consolidates to k-medoids prototypes (0 = unbounded)
+    GALLERY_CONSOLIDATION_CENTROID = os.getenv('GALLERY_CONSOLIDATION_CENTROID', 'False') == 'True'  # Keep the mean embedding as one of the prototypes
+    GALLERY_RELOAD_INTERVAL = float(os.getenv('GALLERY_RELOAD_INTERVAL', '2'))  # Seconds between checks for enrollments by other processes (0 = off)
+    GALLERY_QUANTIZATION = os.getenv('GALLERY_QUANTIZATION', 'none')  # In-memory gallery: 'none' (float32), 'float16' (1/2 memory) or 'int8' (1/4 memory)
+    GALLERY_RERANK_CANDIDATES = int(os.getenv('GALLERY_RERANK_CANDIDATES', '10'))  # Quantized: closest students per face re-scored exactly from the store
 
     # Camera Settings
     CAMERA_INDEX = int(os.getenv('CAMERA_INDEX', '0'))
     FRAME_WIDTH = 640
     FRAME_HEIGHT = 480
+    CAPTURE_BUFFER_SIZE = int(os.getenv('CAPTURE_BUFFER_SIZE', '2'))  # Most recent frames kept by each camera's capture thread
+    CAPTURE_TIMEOUT = float(os.getenv('CAPTURE_TIMEOUT', '5'))  # Seconds without a new frame before a live stream ends
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Maintenance script to cap the number of stored face embeddings per student
+
+Students above the cap have their embeddings reduced to a diverse set of
+k-medoids prototypes. Run it while the app is stopped, or restart the app
+afterwards so it picks up the consolidated gallery.
+
+Usage:
+    python consolidate_gallery.py [MAX_EMBEDDINGS]
+"""
+
+import sys
+from config import Config
+from gallery_store import GalleryStore
+from face_consolidation import consolidate_store
+
+def consolidate(max_embeddings):
+    """Consolidate every student in the gallery store above max_embeddings"""
+    try:
+        store = GalleryStore(Config.GALLERY_FOLDER, dtype=Config.GALLERY_STORE_DTYPE)
+
+        if not store.exists:
+            print(f"✓ No gallery store in {Config.GALLERY_FOLDER}, nothing to consolidate")
+            return True
+
+        print(f"Consolidating to at most {max_embeddings} embeddings per student...")
+        report = consolidate_store(store, max_embeddings, Config.GALLERY_CONSOLIDATION_CENTROID)
+
+        print(f"✓ Students:           {report['students']}")
+        print(f"✓ Consolidated:       {report['consolidated']}")
+        print(f"✓ Embeddings before:  {report['embeddings_before']}")
+        print(f"✓ Embeddings after:   {report['embeddings_after']}")
+        return True
+
+    except Exception as e:
+        print(f"✗ Error during consolidation: {e}")
+        return False
+
+if __name__ == '__main__':
+    max_embeddings = int(sys.argv[1]) if len(sys.argv) > 1 else Config.GALLERY_MAX_EMBEDDINGS
+
+    print("=" * 60)
+    print("Gallery consolidation")
+    print("=" * 60)
+
+    if max_embeddings <= 0:
+        print("✗ MAX_EMBEDDINGS must be positive")
+        sys.exit(1)
+
+    success = consolidate(max_embeddings)
+
+    if success:
+        print("\n✓ Consolidation completed successfully!")
+        sys.exit(0)
+    else:
+        print("\n✗ Consolidation failed!")
+        sys.exit(1)
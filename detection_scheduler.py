@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class DetectionScheduler:
+    def __init__(self, detect_batch, batch_wait_ms=10):
+        """
+        Run face detection for several cameras as one batch
+
+        Every live stream registers its camera and hands its latest frame to
+        detect(). A background thread gathers the pending frames and calls
+        ``detect_batch`` once for all of them as soon as every registered
+        camera has a frame waiting, or ``batch_wait_ms`` after the first
+        frame arrived, so a stalled camera never holds up the others. Cameras
+        marked idle (e.g. by a motion gate) are not waited for at all. The
+        boxes are routed back to the camera that submitted each frame.
+
+        Args:
+            detect_batch: Callable taking a list of frames and returning the
+                detections of each (FaceDetector.detect_batch or detect_faces_batch)
+            batch_wait_ms: Longest time a frame waits for the other cameras
+        """
+        self.detect_batch = detect_batch
+        self.batch_wait = batch_wait_ms / 1000.0
+        self._condition = threading.Condition()
+        self._cameras = {}
+        self._pending = {}
+        self._idle = set()
+        self._thread = None
+        self.stats = {'batches': 0, 'frames': 0, 'errors': 0}
+
+    def register(self, camera_id):
+        """Count a camera as active so batches wait for its frames"""
+        with self._condition:
+            self._cameras[camera_id] = self._cameras.get(camera_id, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='detection-scheduler', daemon=True)
+                self._thread.start()
+
+    def unregister(self, camera_id):
+        """Stop waiting for a camera whose stream ended"""
+        with self._condition:
+            streams = self._cameras.get(camera_id, 0) - 1
+            if streams > 0:
+                self._cameras[camera_id] = streams
+            else:
+                self._cameras.pop(camera_id, None)
+                self._idle.discard(camera_id)
+            # The remaining cameras may now complete a batch
+            self._condition.notify_all()
+
+    def set_idle(self, camera_id, idle):
+        """Mark a camera that is not submitting frames for now, so batches do not wait for it"""
+        with self._condition:
+            if idle:
+                self._idle.add(camera_id)
+            else:
+                self._idle.discard(camera_id)
+            self._condition.notify_all()
+
+    def detect(self, camera_id, frame, timeout=None):
+        """
+        Detect faces in a camera's latest frame as part of the next batch
+
+        Args:
+            camera_id: Registered camera the frame comes from
+            frame: OpenCV image/frame
+            timeout: Seconds to wait for the result (None waits until done)
+
+        Returns:
+            The frame's detections, as returned by ``detect_batch``
+        """
+        future = Future()
+        with self._condition:
+            # Several streams of one camera share a batch slot: only the newest
+            # frame is detected and every waiter gets its boxes
+            _, futures = self._pending.get(camera_id, (None, []))
+            self._pending[camera_id] = (frame, futures + [future])
+            self._condition.notify_all()
+        return future.result(timeout=timeout)
+
+    def status(self):
+        """Scheduler statistics for health checks"""
+        with self._condition:
+            batches = self.stats['batches']
+            return {
+                'cameras': len(self._cameras),
+                'idle': len(self._idle),
+                'pending': len(self._pending),
+                **self.stats,
+                'mean_batch_size': round(self.stats['frames'] / batches, 2) if batches else None
+            }
+
+    def _batch_complete(self):
+        return all(camera_id in self._pending or camera_id in self._idle for camera_id in self._cameras)
+
+    def _run(self):
+        """Collect one frame per camera, detect them together and route the boxes back"""
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.batch_wait
+                while not self._batch_complete():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending
+                self._pending = {}
+
+            waiters = [futures for _, futures in batch.values()]
+            try:
+                results = self.detect_batch([frame for frame, _ in batch.values()])
+            except Exception as e:
+                with self._condition:
+                    self.stats['errors'] += 1
+                for futures in waiters:
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+
+            with self._condition:
+                self.stats['batches'] += 1
+                self.stats['frames'] += len(waiters)
+            for futures, boxes in zip(waiters, results):
+                for future in futures:
+                    future.set_result(boxes)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Export the YOLO detector(s) to ONNX for DETECTOR_RUNTIME=onnx
+
+Run it once on a machine with ultralytics/torch installed, then copy
+models/onnx/ to the inference nodes: they only need onnxruntime. Each export
+is checked against the original model's detections on the enrolled photos.
+
+Usage:
+    python export_detector.py [BACKEND ...] [--int8]
+"""
+
+import sys
+from config import Config
+from face_detector import FaceDetector, DETECTOR_BACKENDS
+from onnx_parity import read_parity
+
+def export(backend, quantize):
+    """Export (if needed) and load the ONNX model of one YOLO backend"""
+    try:
+        detector = FaceDetector(backend, runtime='onnx', quantize=quantize)
+        print(f"✓ {backend}: {detector.model.path.name}")
+        return True
+    except Exception as e:
+        print(f"✗ {backend}: {e}")
+        return False
+
+def print_parity():
+    """Show the recorded parity results"""
+    for name, result in read_parity().items():
+        if 'recall' not in result:
+            continue  # Embedding model results
+        recall = "n/a" if result['recall'] is None else f"{result['recall']:.3f}"
+        status = "✓" if result['passed'] else "✗"
+        print(f"  {status} {name}: recall {recall} on {result['faces']} detections in {result['frames']} photos")
+
+if __name__ == '__main__':
+    backends = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or [Config.DETECTOR_BACKEND]
+    yolo_backends = [backend for backend in DETECTOR_BACKENDS if backend != 'yunet']
+    if any(backend not in yolo_backends for backend in backends):
+        print(__doc__)
+        print(f"BACKEND must be one of {yolo_backends}")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Detector ONNX export")
+    print("=" * 60)
+
+    success = all([export(backend, '--int8' in sys.argv) for backend in backends])
+    print_parity()
+
+    if success:
+        print("\n✓ Export completed! Set DETECTOR_RUNTIME=onnx to use it")
+        sys.exit(0)
+    else:
+        print("\n✗ Export failed!")
+        sys.exit(1)
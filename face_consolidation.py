@@ -0,0 +1,112 @@
+import numpy as np
+
+
+def k_medoids(vectors, k, iterations=20):
+    """
+    Pick k representative rows of L2-normalized vectors (cosine k-medoids)
+
+    Medoids are seeded farthest-first, so the initial prototypes are already
+    diverse, then refined by alternating assignment and medoid update.
+
+    Args:
+        vectors: Normalized embeddings (n, dim)
+        k: Number of medoids
+        iterations: Maximum refinement rounds
+
+    Returns:
+        Sorted array of row indices of the medoids
+    """
+    count = len(vectors)
+    if count <= k:
+        return np.arange(count)
+
+    distances = 1.0 - vectors @ vectors.T
+
+    # Start from the most central row, then repeatedly add the row farthest from all medoids
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < k:
+        medoids.append(int(np.argmax(distances[:, medoids].min(axis=1))))
+
+    for _ in range(iterations):
+        labels = np.argmin(distances[:, medoids], axis=1)
+        updated = []
+        for cluster, medoid in enumerate(medoids):
+            members = np.flatnonzero(labels == cluster)
+            if len(members) == 0:
+                updated.append(medoid)  # Duplicate of another medoid; keep it
+                continue
+            updated.append(int(members[np.argmin(distances[np.ix_(members, members)].sum(axis=1))]))
+        if updated == medoids:
+            break
+        medoids = updated
+
+    return np.unique(medoids)
+
+
+def consolidate_embeddings(embeddings, max_embeddings, centroid=False):
+    """
+    Reduce a student's embeddings to at most max_embeddings diverse prototypes
+
+    Args:
+        embeddings: Normalized embeddings of one student (n, dim)
+        max_embeddings: Upper bound on the returned rows
+        centroid: Spend one of the slots on the normalized mean embedding
+
+    Returns:
+        float32 array (<= max_embeddings, dim); the input if already within the cap
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(embeddings) <= max_embeddings:
+        return embeddings
+
+    medoid_count = max_embeddings - 1 if centroid and max_embeddings > 1 else max_embeddings
+    prototypes = embeddings[k_medoids(embeddings, medoid_count)]
+    if medoid_count < max_embeddings:
+        mean = embeddings.mean(axis=0)
+        norm = np.linalg.norm(mean)
+        prototypes = np.vstack((prototypes, mean / norm if norm else mean))
+    return prototypes.astype(np.float32)
+
+
+def consolidate_store(store, max_embeddings, centroid=False):
+    """
+    Batch-consolidate every student of a GalleryStore above the cap
+
+    All replacements go to the store in one write under its cross-process
+    lock (so concurrent enrollments are not lost), followed by a compaction.
+
+    Args:
+        store: GalleryStore instance
+        max_embeddings: Per-student cap (0 disables consolidation)
+        centroid: Spend one slot per student on the mean embedding
+
+    Returns:
+        Dict with students, consolidated, embeddings_before and embeddings_after
+    """
+    # counts() rather than load(): load() would swallow other processes'
+    # pending changes, which the hot reload must still apply
+    counts = store.counts()
+    report = {
+        'students': len(counts),
+        'consolidated': 0,
+        'embeddings_before': int(sum(counts.values())),
+        'embeddings_after': int(sum(counts.values()))
+    }
+    if not max_embeddings:
+        return report
+
+    def consolidate(existing):
+        # Counts may be stale by now; decide on the locked rows
+        if existing is None or len(existing) <= max_embeddings:
+            return None
+        prototypes = consolidate_embeddings(existing, max_embeddings, centroid)
+        report['embeddings_after'] -= len(existing) - len(prototypes)
+        return prototypes, True
+
+    over_cap = [student_id for student_id, count in counts.items() if count > max_embeddings]
+    results = store.update_many([(student_id, consolidate, None) for student_id in over_cap])
+
+    report['consolidated'] = sum(result is not None for result in results)
+    if report['consolidated']:
+        store.compact()
+    return report
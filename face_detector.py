@@ -1,17 +1,189 @@
+import threading
+import time
 import cv2
 import numpy as np
-import torch
-from ultralytics import YOLO
 from pathlib import Path
 from config import Config
+from onnx_parity import read_parity, record_parity
+
+# Compact per-frame detection result: full-resolution box, detector confidence and
+# five landmarks (right eye, left eye, nose, right and left mouth corner; NaN if unknown)
+DETECTION_DTYPE = np.dtype([('x1', np.int32), ('y1', np.int32), ('x2', np.int32), ('y2', np.int32),
+                            ('score', np.float32), ('landmarks', np.float32, (5, 2))])
+
+# 'yolo_person': COCO person boxes (whole body), 'yolo_face': YOLO trained on faces,
+# 'yunet': OpenCV DNN face detector
+DETECTOR_BACKENDS = ('yolo_person', 'yolo_face', 'yunet')
+FACE_BACKENDS = ('yolo_face', 'yunet')  # Backends returning tight face boxes
+
+YUNET_URL = 'https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx'
+
+
+def camera_backend(camera_index):
+    """
+    Detector backend of a camera from Config.CAMERA_DETECTOR_BACKENDS ("0:yunet,2:yolo_face")
+
+    Args:
+        camera_index: Camera index
+
+    Returns:
+        Backend name; Config.DETECTOR_BACKEND for cameras not listed
+    """
+    for entry in Config.CAMERA_DETECTOR_BACKENDS.split(','):
+        camera, _, backend = entry.partition(':')
+        if camera.strip() and camera.strip() == str(camera_index) and backend.strip():
+            return backend.strip()
+    return Config.DETECTOR_BACKEND
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Pairwise intersection over union of two box lists
+
+    Args:
+        boxes_a: Boxes [(x1, y1, x2, y2), ...] or an (n, 4) array
+        boxes_b: Boxes in the same coordinates, (m, 4)
+
+    Returns:
+        float32 array (n, m)
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    areas_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    areas_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(areas_a + areas_b - intersection, 1e-9)
+
+
+def match_boxes(iou, iou_threshold):
+    """
+    Greedy one-to-one matching, highest IoU first
+
+    Args:
+        iou: IoU matrix (n, m), e.g. from box_iou()
+        iou_threshold: Minimum IoU of a match
+
+    Returns:
+        List of (row, column) pairs
+    """
+    iou = iou.copy()
+    matches = []
+    while iou.size and iou.max() >= iou_threshold:
+        row, column = np.unravel_index(np.argmax(iou), iou.shape)
+        iou[row, :] = 0
+        iou[:, column] = 0
+        matches.append((int(row), int(column)))
+    return matches
+
+
+def box_recall(reference, detections, iou_threshold=0.5):
+    """
+    Fraction of reference boxes matched by a detection (greedy, one-to-one by IoU)
+
+    Args:
+        reference: List of reference boxes [(x1, y1, x2, y2), ...]
+        detections: List of detected boxes in the same coordinates
+        iou_threshold: Minimum IoU for a detection to count as the same face
+
+    Returns:
+        Tuple of (matched, total)
+    """
+    if not reference or not detections:
+        return 0, len(reference)
+    return len(match_boxes(box_iou(reference, detections), iou_threshold)), len(reference)
+
+
+class OnnxYolo:
+    def __init__(self, path, threads=0):
+        """
+        ONNX Runtime CPU session for an exported YOLO detector (no torch needed)
+
+        Args:
+            path: Path to the .onnx file (exported with a dynamic batch and image size)
+            threads: Intra-op threads (0 = ONNX Runtime default, one per core)
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.path = path
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        """Raw predictions (batch, 4 + classes [+ keypoints], anchors) for an NCHW float batch"""
+        return self.session.run(None, {self.input_name: batch})[0]
+
 
 class FaceDetector:
-    def __init__(self):
-        """Initialize YOLO model for face detection"""
+    # Candidate input sizes (longest side, multiples of YOLO's stride of 32) for tuning
+    DETECTION_SIZES = (160, 224, 320, 416, 512, 640)
+
+    # YOLO's default input size, used by the ONNX runtime when DETECTION_SIZE is 0
+    DEFAULT_YOLO_SIZE = 640
+    NMS_IOU = 0.7  # Same NMS IoU threshold as ultralytics
+
+    def __init__(self, backend=None, detection_size=None, runtime=None, quantize=None):
+        """
+        Initialize the face detection model
+
+        Args:
+            backend: One of DETECTOR_BACKENDS (default Config.DETECTOR_BACKEND)
+            detection_size: Longest side in pixels of the image the model sees
+                (default Config.DETECTION_SIZE, 0 = the model's own default)
+            runtime: YOLO backends only: 'ultralytics' (PyTorch) or 'onnx'
+                (ONNX Runtime, exported on first use) (default Config.DETECTOR_RUNTIME)
+            quantize: ONNX runtime only: prefer the int8 model (default Config.DETECTOR_ONNX_QUANTIZE)
+        """
+        self.backend = backend or Config.DETECTOR_BACKEND
+        if self.backend not in DETECTOR_BACKENDS:
+            raise ValueError(f"Unknown detector backend '{self.backend}', expected one of {DETECTOR_BACKENDS}")
+
+        self.confidence_threshold = Config.CONFIDENCE_THRESHOLD
+        self.detection_size = Config.DETECTION_SIZE if detection_size is None else detection_size
+
+        if self.backend == 'yunet':
+            self.runtime = 'opencv'
+            self.model = self._load_yunet()
+            # The detector keeps its input size as state, so concurrent calls
+            # on different frame sizes must not interleave
+            self._yunet_lock = threading.Lock()
+            return
+
+        if self.backend == 'yolo_face':
+            weights = Config.MODELS_FOLDER / Config.YOLO_FACE_MODEL
+            if not weights.exists() and not self._onnx_paths(weights)[0].exists():
+                raise FileNotFoundError(f"YOLO face weights not found at {weights} (set YOLO_FACE_MODEL)")
+            weights = str(weights)
+        else:
+            weights = Config.YOLO_MODEL
+
+        self.runtime = runtime or Config.DETECTOR_RUNTIME
+        if self.runtime == 'onnx':
+            self.model = self._load_onnx_yolo(weights, Config.DETECTOR_ONNX_QUANTIZE if quantize is None else quantize)
+        else:
+            self.model = self._load_yolo(weights)
+
+    @property
+    def tight_boxes(self):
+        """Whether boxes frame the face itself (not the whole person)"""
+        return self.backend in FACE_BACKENDS
+
+    @staticmethod
+    def _load_yolo(weights):
+        """Load YOLO weights through ultralytics"""
+        # Imported here so extract_face/draw_faces can be used without loading torch
+        import torch
+        from ultralytics import YOLO
+
         model_path = Config.MODELS_FOLDER / Config.YOLO_MODEL
 
         # Download YOLOv8 model if not exists
-        if not model_path.exists():
+        if weights == Config.YOLO_MODEL and not model_path.exists():
             print("Downloading YOLOv8 model...")
 
         # Fix for PyTorch 2.6+ weights_only default change
@@ -22,14 +194,121 @@ class FaceDetector:
             return original_torch_load(*args, **kwargs)
 
         torch.load = patched_load
-        self.model = YOLO(Config.YOLO_MODEL)
-        torch.load = original_torch_load  # Restore original
+        try:
+            return YOLO(weights)
+        finally:
+            torch.load = original_torch_load  # Restore original
 
-        self.confidence_threshold = Config.CONFIDENCE_THRESHOLD
+    @staticmethod
+    def _onnx_paths(weights):
+        """float32 and int8 ONNX export paths of YOLO weights"""
+        stem = Path(weights).stem
+        return Config.ONNX_MODELS_FOLDER / f"{stem}.onnx", Config.ONNX_MODELS_FOLDER / f"{stem}.int8.onnx"
+
+    def _load_onnx_yolo(self, weights, quantize):
+        """
+        Load the ONNX export of YOLO weights, exporting and checking it on first use
+
+        Exporting needs ultralytics/torch once; afterwards only onnxruntime is
+        imported. Each export must find (IoU >= 0.5) at least
+        DETECTOR_ONNX_MIN_RECALL of the reference model's detections on the
+        enrolled photos, otherwise it is not used. The int8 model is only used
+        once there are detections to check it against.
+
+        Args:
+            weights: YOLO weights name or path
+            quantize: Prefer the int8 dynamically quantized model
+
+        Returns:
+            OnnxYolo instance
+        """
+        folder = Config.ONNX_MODELS_FOLDER
+        folder.mkdir(parents=True, exist_ok=True)
+        fp32_path, int8_path = self._onnx_paths(weights)
+        parity = read_parity()
+
+        if not fp32_path.exists():
+            reference = self._load_yolo(weights)
+            # Dynamic axes let one export serve every batch size and DETECTION_SIZE
+            exported = reference.export(format='onnx', dynamic=True, simplify=True)
+            Path(exported).replace(fp32_path)
+            print(f"Exported {fp32_path.name}")
+            candidate = OnnxYolo(fp32_path, Config.DETECTOR_ONNX_THREADS)
+            parity[fp32_path.name] = self._detection_parity(reference, 'ultralytics', candidate)
+            record_parity(fp32_path.name, parity[fp32_path.name])
+            if not parity[fp32_path.name]['passed']:
+                fp32_path.unlink()
+                recall = parity[fp32_path.name]['recall']
+                raise RuntimeError(f"ONNX export of {weights} misses detections "
+                                   f"(recall {'n/a' if recall is None else f'{recall:.3f}'})")
+
+        model = OnnxYolo(fp32_path, Config.DETECTOR_ONNX_THREADS)
+        if not quantize:
+            return model
+
+        if not parity.get(int8_path.name, {}).get('faces'):
+            if not int8_path.exists():
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+
+                quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+            candidate = OnnxYolo(int8_path, Config.DETECTOR_ONNX_THREADS)
+            result = self._detection_parity(model, 'onnx', candidate)
+            if not result['faces']:
+                # Not recorded, so the check runs again once photos are enrolled
+                print("No detections in the enrolled photos to check the int8 detector against, "
+                      "using the float32 ONNX model")
+                return model
+            parity[int8_path.name] = result
+            record_parity(int8_path.name, result)
+
+        result = parity[int8_path.name]
+        if not result['passed']:
+            recall = "n/a" if result['recall'] is None else f"{result['recall']:.3f}"
+            print(f"int8 detector misses detections (recall {recall}), using the float32 ONNX model")
+            return model
+        return OnnxYolo(int8_path, Config.DETECTOR_ONNX_THREADS)
+
+    def _detection_parity(self, reference, reference_runtime, candidate, limit=32):
+        """Recall of an ONNX model against a reference model's detections on the enrolled photos"""
+        frames = [image for image in (cv2.imread(str(path))
+                                      for path in sorted(Config.UPLOAD_FOLDER.rglob('*.jpg'))[:limit])
+                  if image is not None]
+        size = self.detection_size or self.DEFAULT_YOLO_SIZE
+        expected = [detections[['x1', 'y1', 'x2', 'y2']].tolist()
+                    for frame in frames for detections in self._run(reference, reference_runtime, [frame], size)]
+        found = [detections[['x1', 'y1', 'x2', 'y2']].tolist()
+                 for frame in frames for detections in self._run(candidate, 'onnx', [frame], size)]
+
+        matched, total = 0, 0
+        for boxes, candidate_boxes in zip(expected, found):
+            hits, count = box_recall(boxes, candidate_boxes)
+            matched += hits
+            total += count
+        recall = matched / total if total else None
+        return {
+            'frames': len(frames),
+            'faces': total,
+            'recall': recall,
+            # Without reference detections there is nothing to compare; only the
+            # lossless float32 export is trusted then
+            'passed': recall >= Config.DETECTOR_ONNX_MIN_RECALL if total else reference_runtime == 'ultralytics'
+        }
+
+    @staticmethod
+    def _load_yunet():
+        """Create OpenCV's YuNet face detector, downloading the model on first use"""
+        model_path = Config.MODELS_FOLDER / Config.YUNET_MODEL
+        if not model_path.exists():
+            import urllib.request
+            print("Downloading YuNet face detection model...")
+            model_path.parent.mkdir(parents=True, exist_ok=True)
+            urllib.request.urlretrieve(YUNET_URL, str(model_path))
+        # Score threshold and input size are set per call
+        return cv2.FaceDetectorYN.create(str(model_path), "", (320, 320), 0.5, 0.3, 5000)
 
     def detect_faces(self, frame):
         """
-        Detect faces in a frame using YOLO
+        Detect faces in a frame with the configured backend
 
         Args:
             frame: OpenCV image/frame
@@ -37,28 +316,213 @@ class FaceDetector:
         Returns:
             List of face bounding boxes [(x1, y1, x2, y2), ...]
         """
-        # Run YOLO detection
-        results = self.model(frame, verbose=False)
+        return self.detect_faces_batch([frame])[0]
+
+    def detect_faces_batch(self, frames, detection_size=None):
+        """
+        Detect faces in several frames (one forward pass for YOLO backends)
+
+        Used to serve every camera of a room with a single batch instead of
+        one model call per camera. Frames larger than the detection size are
+        downscaled before detection and the boxes are scaled back, so they
+        (and the recognition crops taken with them) use full-resolution
+        frame coordinates.
+
+        Args:
+            frames: List of OpenCV images/frames (sizes may differ)
+            detection_size: Override of self.detection_size for this call
+
+        Returns:
+            List with the face bounding boxes of each frame, in input order
+        """
+        return [detections[['x1', 'y1', 'x2', 'y2']].tolist()
+                for detections in self.detect_batch(frames, detection_size)]
+
+    def detect_batch(self, frames, detection_size=None):
+        """
+        Detect faces in several frames, returning compact numpy results
+
+        YOLO backends run all frames in one forward pass, with class and
+        confidence filtering inside NMS; the surviving boxes of each frame
+        are copied to the host once. YuNet runs frame by frame.
+
+        Args:
+            frames: List of OpenCV images/frames (sizes may differ)
+            detection_size: Override of self.detection_size for this call
+
+        Returns:
+            List of DETECTION_DTYPE structured arrays (one per frame) with
+            boxes clipped to the frame bounds
+        """
+        if not frames:
+            return []
+
+        size = self.detection_size if detection_size is None else detection_size
+        return self._run(self.model, self.runtime, frames, size)
+
+    def _run(self, model, runtime, frames, size):
+        """Detect with the given model and runtime: list of DETECTION_DTYPE arrays"""
+        if runtime == 'onnx':
+            size = size or self.DEFAULT_YOLO_SIZE
+        inputs, scales = zip(*(self._downscale(frame, size) for frame in frames))
+        if runtime == 'opencv':
+            return [self._detect_yunet(image, scale, frame.shape)
+                    for image, scale, frame in zip(inputs, scales, frames)]
+
+        if runtime == 'onnx':
+            predictions = model.predict(self._letterbox(inputs))
+            return [self._parse_predictions(prediction, scale, frame.shape)
+                    for prediction, scale, frame in zip(predictions, scales, frames)]
+
+        options = {'imgsz': max(32, int(np.ceil(size / 32)) * 32)} if size else {}
+
+        # Run YOLO detection; class 0 is 'person' in COCO and 'face' in face models
+        results = model(list(inputs), verbose=False, classes=[0], conf=self.confidence_threshold, **options)
+        return [self._parse_result(result, scale, frame.shape)
+                for result, scale, frame in zip(results, scales, frames)]
+
+    @staticmethod
+    def _letterbox(images):
+        """
+        Pad images to one shared size (multiples of 32) for a batched ONNX pass
+
+        Images keep their top-left corner, so boxes need no offset correction.
+        The batch is only as large as its largest image (rectangular, like
+        ultralytics' rect inference), not a full square.
+        """
+        height = int(np.ceil(max(image.shape[0] for image in images) / 32)) * 32
+        width = int(np.ceil(max(image.shape[1] for image in images) / 32)) * 32
+        batch = np.full((len(images), height, width, 3), 114, dtype=np.uint8)
+        for i, image in enumerate(images):
+            batch[i, :image.shape[0], :image.shape[1]] = image
+        # BGR uint8 NHWC -> RGB float NCHW in [0, 1]
+        return np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+    def tune_detection_size(self, frames, sizes=None, min_recall=0.95):
+        """
+        Find the smallest detection size that still finds the faces of a camera
+
+        Detections on the frames at their full resolution are the reference;
+        each candidate size is timed frame by frame and scored by the
+        fraction of reference boxes it finds (IoU >= 0.5).
+
+        Args:
+            frames: Representative frames of the camera (typical distance and lighting)
+            sizes: Candidate sizes (default DETECTION_SIZES)
+            min_recall: Smallest acceptable recall relative to full resolution
+
+        Returns:
+            Dict with the chosen size, the reference size and face count, and
+            per-size results [{'size', 'recall', 'fps'}, ...]
+        """
+        reference_size = max(max(frame.shape[:2]) for frame in frames)
+        reference = self.detect_faces_batch(frames, reference_size)
+        reference_faces = sum(len(boxes) for boxes in reference)
+
+        results = []
+        chosen = None
+        for size in sorted(sizes or self.DETECTION_SIZES):
+            self.detect_faces_batch(frames[:1], size)  # warm-up for this input shape
+            start = time.perf_counter()
+            detections = [self.detect_faces_batch([frame], size)[0] for frame in frames]
+            elapsed = time.perf_counter() - start
+
+            matched = sum(box_recall(expected, found)[0] for expected, found in zip(reference, detections))
+            recall = matched / reference_faces if reference_faces else 1.0
+            results.append({'size': size, 'recall': recall, 'fps': len(frames) / elapsed})
+            if chosen is None and recall >= min_recall:
+                chosen = size
+
+        return {
+            'size': chosen if chosen is not None else reference_size,
+            'reference_size': reference_size,
+            'reference_faces': reference_faces,
+            'results': results
+        }
+
+    @staticmethod
+    def _downscale(frame, size):
+        """Shrink a frame so its longest side is at most size: (image, scale)"""
+        height, width = frame.shape[:2]
+        scale = size / max(height, width) if size else 1.0
+        if scale >= 1.0:
+            return frame, 1.0
+        resized = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                             interpolation=cv2.INTER_AREA)
+        return resized, scale
+
+    def _parse_result(self, result, scale, shape):
+        """Full-resolution boxes of the confident detections of one YOLO result"""
+        if result.boxes is None or len(result.boxes) == 0:
+            return np.empty(0, dtype=DETECTION_DTYPE)
+
+        # One device-to-host copy of the whole (n, 6) [x1, y1, x2, y2, conf, cls] tensor
+        data = result.boxes.data.cpu().numpy()
+        # NMS already filtered; this keeps the result right for models that ignore classes/conf
+        keep = (data[:, 4] >= self.confidence_threshold) & (data[:, 5] == 0)
+
+        landmarks = None
+        keypoints = getattr(result, 'keypoints', None)
+        if keypoints is not None and keypoints.data.shape[1] == 5:
+            # Face models with a pose head predict the five facial landmarks
+            landmarks = keypoints.data.cpu().numpy()[keep, :, :2]
+        return self._detections(data[keep, :4], data[keep, 4], landmarks, scale, shape)
+
+    def _parse_predictions(self, prediction, scale, shape):
+        """Confidence filter and NMS of one image's raw ONNX YOLO output (channels, anchors)"""
+        prediction = prediction.T
+        # Face models have one class, optionally followed by 5 keypoints x (x, y, visibility)
+        classes = 1 if self.backend == 'yolo_face' else prediction.shape[1] - 4
+        scores = prediction[:, 4:4 + classes]
+        best = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(scores)), best]
+        keep = np.flatnonzero((best == 0) & (confidence >= self.confidence_threshold))
+        if len(keep) == 0:
+            return np.empty(0, dtype=DETECTION_DTYPE)
+
+        centers, sizes = prediction[keep, 0:2], prediction[keep, 2:4]
+        boxes = np.hstack((centers - sizes / 2, centers + sizes / 2))
+        selected = cv2.dnn.NMSBoxes(np.hstack((boxes[:, :2], sizes)).tolist(), confidence[keep].tolist(),
+                                    self.confidence_threshold, self.NMS_IOU)
+        selected = np.asarray(selected, dtype=np.int64).reshape(-1)
+
+        landmarks = None
+        if prediction.shape[1] == 4 + classes + 15:
+            landmarks = prediction[keep[selected], 4 + classes:].reshape(-1, 5, 3)[:, :, :2]
+        return self._detections(boxes[selected], confidence[keep[selected]], landmarks, scale, shape)
+
+    def _detect_yunet(self, image, scale, shape):
+        """Run YuNet on one (downscaled) frame"""
+        height, width = image.shape[:2]
+        with self._yunet_lock:
+            self.model.setInputSize((width, height))
+            self.model.setScoreThreshold(self.confidence_threshold)
+            _, faces = self.model.detect(image)
+        if faces is None:
+            return np.empty(0, dtype=DETECTION_DTYPE)
 
-        faces = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Get confidence and class
-                conf = float(box.conf[0])
-                cls = int(box.cls[0])
+        # Rows are [x, y, w, h, 5 x (landmark x, y), score]
+        boxes = faces[:, :4].copy()
+        boxes[:, 2:] += boxes[:, :2]
+        return self._detections(boxes, faces[:, 14], faces[:, 4:14].reshape(-1, 5, 2), scale, shape)
 
-                # Class 0 is 'person' in COCO dataset
-                # For face detection, we'll use person detection
-                # You can fine-tune YOLO for face detection specifically
-                if conf >= self.confidence_threshold and cls == 0:
-                    # Get bounding box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    faces.append((int(x1), int(y1), int(x2), int(y2)))
+    @staticmethod
+    def _detections(boxes, scores, landmarks, scale, shape):
+        """Scale boxes/landmarks to full resolution, clip them to the frame and pack DETECTION_DTYPE"""
+        height, width = shape[:2]
+        boxes = boxes / scale
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
 
-        return faces
+        detections = np.empty(len(boxes), dtype=DETECTION_DTYPE)
+        for column, field in enumerate(('x1', 'y1', 'x2', 'y2')):
+            detections[field] = boxes[:, column]
+        detections['score'] = scores
+        detections['landmarks'] = np.nan if landmarks is None else landmarks / scale
+        return detections
 
-    def extract_face(self, frame, bbox):
+    @staticmethod
+    def extract_face(frame, bbox):
         """
         Extract face region from frame
 
@@ -67,13 +531,18 @@ class FaceDetector:
             bbox: Bounding box tuple (x1, y1, x2, y2)
 
         Returns:
-            Cropped face image
+            Cropped face image (a numpy view into the frame, ready for
+            FaceRecognizer.recognize_face without writing to disk)
         """
         x1, y1, x2, y2 = bbox
+        height, width = frame.shape[:2]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(width, x2), min(height, y2)
         face = frame[y1:y2, x1:x2]
         return face
 
-    def draw_faces(self, frame, faces, labels=None):
+    @staticmethod
+    def draw_faces(frame, faces, labels=None):
         """
         Draw bounding boxes on detected faces
 
@@ -0,0 +1,229 @@
+import cv2
+import numpy as np
+from deepface import DeepFace
+from deepface.modules import detection
+from config import Config
+from onnx_parity import read_parity, record_parity
+
+
+class OnnxModel:
+    def __init__(self, path, threads=0):
+        """
+        ONNX Runtime CPU session for an exported recognition model
+
+        Args:
+            path: Path to the .onnx file
+            threads: Intra-op threads (0 = ONNX Runtime default, one per core)
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.path = path
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = tuple(model_input.shape[1:3])
+        self.output_shape = self.session.get_outputs()[0].shape[-1]
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class FaceEmbedder:
+    def __init__(self, model_name="Facenet512", detector_backend='opencv', batch_size=None, backend=None,
+                 quantize=None):
+        """
+        Batched face embedding on top of a DeepFace recognition model
+
+        Produces the same embeddings as ``DeepFace.represent`` (same face
+        detection, alignment, resize/pad and normalization), but runs the
+        model once for a whole stack of faces instead of once per image.
+
+        With the 'onnx' backend the Keras model is exported to ONNX once
+        (optionally int8-quantized) and run through ONNX Runtime. Every
+        exported model must pass a parity check against the model it was
+        derived from, so embeddings stay compatible with the enrolled
+        gallery; if it does not, the embedder falls back to the next most
+        exact model.
+
+        Args:
+            model_name: DeepFace model name
+            detector_backend: DeepFace detector used to locate the face inside each crop
+            batch_size: Maximum faces per forward pass (defaults to Config.EMBEDDING_BATCH_SIZE)
+            backend: 'tensorflow' or 'onnx' (defaults to Config.EMBEDDING_BACKEND)
+            quantize: ONNX only, prefer the int8 model (defaults to Config.ONNX_QUANTIZE)
+        """
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self.batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+        self.backend = backend or Config.EMBEDDING_BACKEND
+        self.model = None
+
+        if self.backend == 'onnx':
+            try:
+                self.model = self._load_onnx_model(Config.ONNX_QUANTIZE if quantize is None else quantize)
+            except Exception as e:
+                print(f"ONNX Runtime backend unavailable ({str(e)}), using TensorFlow")
+                self.backend = 'tensorflow'
+
+        if self.model is None:
+            self.model = DeepFace.build_model(model_name)
+        self.input_shape = self.model.input_shape
+        self.dim = self.model.output_shape
+
+    def preprocess(self, image, enforce_detection=False, detector_backend=None):
+        """
+        Turn a BGR image into a model-ready face tensor
+
+        Args:
+            image: BGR numpy array
+            enforce_detection: Raise if no face is found instead of using the whole image
+            detector_backend: Override the embedder's detector; 'skip' trusts the
+                crop as-is and only resizes/pads it to the model input size
+
+        Returns:
+            float32 array (height, width, 3) scaled to [0, 1]
+        """
+        face_objs = detection.extract_faces(
+            img_path=image,
+            target_size=(self.input_shape[1], self.input_shape[0]),
+            detector_backend=detector_backend or self.detector_backend,
+            grayscale=False,
+            enforce_detection=enforce_detection,
+            align=True
+        )
+        return face_objs[0]["face"][0]
+
+    def embed(self, faces):
+        """
+        Embed preprocessed face tensors in batched forward passes
+
+        Args:
+            faces: List/array of tensors returned by preprocess()
+
+        Returns:
+            float32 array of embeddings (n, dim)
+        """
+        if len(faces) == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        batch = np.asarray(faces, dtype=np.float32)
+        embeddings = [
+            self._forward(batch[start:start + self.batch_size])
+            for start in range(0, len(batch), self.batch_size)
+        ]
+        return np.concatenate(embeddings).astype(np.float32)
+
+    def _forward(self, batch):
+        if isinstance(self.model, OnnxModel):
+            return self.model.predict(batch)
+        return self.model.model(batch, training=False).numpy()
+
+    def _load_onnx_model(self, quantize):
+        """
+        Load the ONNX export of the model, exporting and parity-checking it on first use
+
+        Args:
+            quantize: Prefer the int8 dynamically quantized model
+
+        Returns:
+            OnnxModel instance
+        """
+        folder = Config.ONNX_MODELS_FOLDER
+        folder.mkdir(parents=True, exist_ok=True)
+        fp32_path = folder / f"{self.model_name}.onnx"
+        int8_path = folder / f"{self.model_name}.int8.onnx"
+        parity = read_parity()
+
+        if not fp32_path.exists():
+            keras_model = DeepFace.build_model(self.model_name)
+            self._export_onnx(keras_model, fp32_path)
+            candidate = OnnxModel(fp32_path, Config.ONNX_THREADS)
+            self.input_shape = candidate.input_shape
+            faces, _ = self._calibration_faces()
+            parity[fp32_path.name] = self.parity_check(
+                lambda batch: keras_model.model(batch, training=False).numpy(), candidate.predict, faces)
+            record_parity(fp32_path.name, parity[fp32_path.name])
+            if not parity[fp32_path.name]['passed']:
+                fp32_path.unlink()
+                raise RuntimeError(f"ONNX export does not match {self.model_name} "
+                                   f"(max cosine distance {parity[fp32_path.name]['max_distance']:.4f})")
+
+        model = OnnxModel(fp32_path, Config.ONNX_THREADS)
+        if not quantize:
+            return model
+
+        result = parity.get(int8_path.name)
+        if result is None:
+            if not int8_path.exists():
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+
+                quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+            candidate = OnnxModel(int8_path, Config.ONNX_THREADS)
+            self.input_shape = model.input_shape
+            faces, enrolled = self._calibration_faces()
+            result = self.parity_check(model.predict, candidate.predict, faces)
+            if enrolled:
+                record_parity(int8_path.name, result)
+            else:
+                # Random tensors say little about real faces; checked again once photos are enrolled
+                print("No enrolled photos to check the int8 model against, parity on random input not recorded")
+
+        if not result.get('passed'):
+            print(f"int8 model exceeds the parity tolerance (max cosine distance "
+                  f"{result.get('max_distance', float('nan')):.4f}), using the float32 ONNX model")
+            return model
+        return OnnxModel(int8_path, Config.ONNX_THREADS)
+
+    @staticmethod
+    def _export_onnx(keras_model, path):
+        """Convert a DeepFace Keras model to ONNX with a dynamic batch dimension"""
+        import tensorflow as tf
+        import tf2onnx
+
+        height, width = keras_model.model.input_shape[1:3]
+        signature = (tf.TensorSpec((None, height, width, 3), tf.float32, name='input'),)
+        tf2onnx.convert.from_keras(keras_model.model, input_signature=signature, opset=13, output_path=str(path))
+        print(f"Exported {path.name}")
+
+    def _calibration_faces(self, limit=32):
+        """Faces for parity checks: (faces, True) from enrolled photos, or (random tensors, False) if none exist yet"""
+        faces = []
+        for path in sorted(Config.UPLOAD_FOLDER.rglob('*.jpg'))[:limit]:
+            image = cv2.imread(str(path))
+            if image is not None:
+                faces.append(self.preprocess(image))
+        if not faces:
+            rng = np.random.default_rng(0)
+            return rng.random((limit, self.input_shape[0], self.input_shape[1], 3), dtype=np.float32), False
+        return np.asarray(faces, dtype=np.float32), True
+
+    @staticmethod
+    def parity_check(reference, candidate, faces, tolerance=None):
+        """
+        Compare embeddings of two model runners on the same faces
+
+        Args:
+            reference: Callable mapping a face batch to embeddings (the trusted model)
+            candidate: Callable mapping a face batch to embeddings (the model to validate)
+            faces: float32 array of preprocessed faces (n, height, width, 3)
+            tolerance: Maximum allowed cosine distance (defaults to Config.ONNX_PARITY_TOLERANCE)
+
+        Returns:
+            Dict with mean_distance, max_distance, faces and passed
+        """
+        tolerance = Config.ONNX_PARITY_TOLERANCE if tolerance is None else tolerance
+        a = np.asarray(reference(faces), dtype=np.float32)
+        b = np.asarray(candidate(faces), dtype=np.float32)
+        a /= np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+        b /= np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+        distances = 1.0 - np.sum(a * b, axis=1)
+        return {
+            'mean_distance': float(distances.mean()),
+            'max_distance': float(distances.max()),
+            'faces': int(len(faces)),
+            'passed': bool(distances.max() <= tolerance)
+        }
@@ -0,0 +1,603 @@
+import copy
+import threading
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# Immutable view published to readers after every mutation
+# student_ids holds None for removed blocks still in the matrix; live masks the other
+# blocks and live_ids lists their students (both None while no block is dead)
+GallerySnapshot = namedtuple('GallerySnapshot', ['matrix', 'scales', 'starts', 'student_ids', 'live', 'live_ids',
+                                                 'row_lists', 'index'])
+
+QUANTIZED_DTYPES = {'none': np.float32, 'float16': np.float16, 'int8': np.int8}
+
+
+def _float16_decoder():
+    """
+    Fastest exact float16 -> float32 conversion available
+
+    numpy converts half floats one element at a time, which made float16
+    scoring several times slower than float32. OpenCV uses the CPU's
+    conversion instructions (convertFp16 in OpenCV 4, 16F arithmetic in 5).
+    """
+    candidates = []
+    if hasattr(cv2, 'convertFp16'):
+        candidates.append(lambda codes: cv2.convertFp16(codes.view(np.int16)))
+    candidates.append(lambda codes: cv2.add(codes, 0.0, dtype=cv2.CV_32F))
+    probe = np.array([[0.5, -0.25, 1.0], [0.0, -1.0, 0.125]], dtype=np.float16)
+    for convert in candidates:
+        try:
+            if np.array_equal(convert(probe), probe.astype(np.float32)):
+                # OpenCV rejects empty arrays
+                return lambda codes: convert(codes) if codes.size else codes.astype(np.float32)
+        except cv2.error:
+            pass
+    return lambda codes: codes.astype(np.float32)
+
+
+_decode_float16 = _float16_decoder()
+
+
+class FaceGallery:
+    MAX_CACHED_SUBSETS = 64
+    DECODE_CHUNK_ROWS = 2048  # Small enough for decoded chunks to stay in CPU cache
+    MAX_DEAD_FRACTION = 0.25  # Removed rows tolerated in the buffer before it is compacted
+
+    def __init__(self, dim=512, quantization='none', row_source=None, rerank_candidates=10):
+        """
+        Contiguous float32 matrix of enrolled face embeddings
+
+        Embeddings are L2-normalized on insert so cosine distance reduces to a
+        single matrix multiply. Rows are kept grouped per student, so the
+        per-student minimum distance is one ``np.minimum.reduceat`` call.
+
+        Removing or replacing a student only marks its old block dead (new
+        rows are appended), so a change costs time proportional to its own
+        size. Dead blocks are skipped in results and dropped in one copy once
+        they exceed ``MAX_DEAD_FRACTION`` of the rows.
+
+        With quantization the rows are held as float16 or int8 codes (int8
+        with one scale per row), cutting memory 2x / 4x. Faces are scored on
+        the codes, then the ``rerank_candidates`` closest students of each
+        face are re-scored exactly on float32 rows fetched from
+        ``row_source``.
+
+        Args:
+            dim: Embedding dimension (512 for Facenet512)
+            quantization: 'none', 'float16' or 'int8'
+            row_source: Callable student_id -> float32 embeddings (e.g. GalleryStore.rows)
+                used for the exact re-rank; without it quantized distances are final
+            rerank_candidates: Students re-ranked exactly per face
+        """
+        self.dim = dim
+        self.quantization = quantization
+        self.row_source = row_source
+        self.rerank_candidates = rerank_candidates
+        self.index = None
+        self.min_index_size = 0
+        self._lock = threading.Lock()
+        self._buffer = np.empty((0, dim), dtype=QUANTIZED_DTYPES[quantization])
+        self._scales = np.empty(0, dtype=np.float32)
+        self._lists = np.empty(0, dtype=np.int32)
+        self._size = 0
+        self._student_ids = []
+        self._positions = {}  # student_id -> index into _student_ids/_counts
+        self._counts = []
+        self._dead_rows = 0
+        self._subsets = {}
+        self._publish()
+
+    @classmethod
+    def from_database(cls, face_database, dim=512, **options):
+        """
+        Build a gallery from the pickled ``face_database`` dict
+
+        Args:
+            face_database: Dict of student_id -> {'embeddings': [...], 'embedding': [...]}
+            dim: Embedding dimension used when the database is empty
+            **options: quantization, row_source and rerank_candidates (see __init__)
+
+        Returns:
+            FaceGallery instance
+        """
+        for data in face_database.values():
+            dim = len(data.get('embeddings', [data['embedding']])[0])
+            break
+
+        blocks = [cls.normalize(data.get('embeddings', [data['embedding']])) for data in face_database.values()]
+        if not blocks:
+            return cls(dim, **options)
+        return cls.from_matrix(np.concatenate(blocks), list(face_database), [len(b) for b in blocks], **options)
+
+    @classmethod
+    def from_matrix(cls, matrix, student_ids, counts, **options):
+        """
+        Wrap an already normalized matrix whose rows are grouped per student
+
+        Unquantized, the matrix is used as-is (e.g. a read-only memmap from
+        GalleryStore); it is only copied when the gallery is later modified.
+        Quantized, it is encoded chunk by chunk without a full float32 copy.
+
+        Args:
+            matrix: float32 array (n, dim)
+            student_ids: Student ID of each block of rows, in order
+            counts: Number of rows of each student
+            **options: quantization, row_source and rerank_candidates (see __init__)
+
+        Returns:
+            FaceGallery instance
+        """
+        gallery = cls(matrix.shape[1] if matrix.ndim == 2 and matrix.shape[1] else 512, **options)
+        if len(student_ids):
+            if gallery.quantization == 'none':
+                gallery._buffer = matrix
+            else:
+                gallery._buffer = np.empty(matrix.shape, dtype=gallery._buffer.dtype)
+                if gallery.quantization == 'int8':
+                    gallery._scales = np.empty(matrix.shape[0], dtype=np.float32)
+                for start in range(0, matrix.shape[0], cls.DECODE_CHUNK_ROWS):
+                    gallery._store_rows(start, np.asarray(matrix[start:start + cls.DECODE_CHUNK_ROWS], dtype=np.float32))
+            gallery._size = matrix.shape[0]
+            gallery._student_ids = list(student_ids)
+            gallery._positions = {student_id: i for i, student_id in enumerate(gallery._student_ids)}
+            gallery._counts = list(counts)
+        gallery._publish()
+        return gallery
+
+    @staticmethod
+    def normalize(vectors):
+        """L2-normalize rows, leaving zero vectors as zeros (distance 1.0 to everything)"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def __len__(self):
+        return self._size - self._dead_rows
+
+    @property
+    def nbytes(self):
+        """Memory held by the embedding rows (codes and scales when quantized)"""
+        return self._buffer[:self._size].nbytes + self._scales[:self._size].nbytes
+
+    @property
+    def student_count(self):
+        return len(self._positions)
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def attach_index(self, index, min_size=0, row_lists=None, student_ids=None):
+        """
+        Use an approximate nearest-neighbour index for large galleries
+
+        Args:
+            index: IVFIndex instance (trained on the gallery if it is not yet)
+            min_size: Below this many rows, matching stays exact
+            row_lists: Persisted row assignments, reused if they still fit the gallery
+            student_ids: Student order the persisted assignments were made for
+        """
+        with self._lock:
+            self.index = index
+            self.min_index_size = min_size
+            if not index.trained:
+                index.train(self._rows(0, self._size))
+            if not index.trained:
+                # Empty gallery; rebuild_index() trains once enough rows exist
+                self._publish()
+                return
+
+            if (row_lists is not None and len(row_lists) == self._size
+                    and student_ids == [str(s) for s in self._student_ids]):
+                self._lists = np.array(row_lists, dtype=np.int32)
+            else:
+                self._lists = index.assign(self._rows(0, self._size))
+            self._publish()
+
+    def index_state(self):
+        """
+        Attached index with the row assignments of the live rows, as IVFIndex.save takes them
+
+        Returns:
+            Tuple of (index, row_lists, student_ids) or None without a trained index
+        """
+        snapshot = self._snapshot
+        if snapshot.index is None:
+            return None
+        if snapshot.live is None:
+            return snapshot.index, snapshot.row_lists, snapshot.student_ids
+        counts = np.diff(np.append(snapshot.starts, snapshot.matrix.shape[0]))
+        return snapshot.index, snapshot.row_lists[np.repeat(snapshot.live, counts)], snapshot.live_ids
+
+    def subset(self, student_ids):
+        """
+        Exact-search gallery restricted to a set of candidate students
+
+        Sub-galleries are cached per candidate set and dropped when one of
+        their students is enrolled or deleted.
+
+        Args:
+            student_ids: Iterable of candidate student IDs (e.g. a course roster)
+
+        Returns:
+            FaceGallery containing only the candidates' embeddings
+        """
+        key = frozenset(student_ids)
+        cached = self._subsets.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            snapshot = self._snapshot
+            sub = FaceGallery(self.dim, self.quantization, self.row_source, self.rerank_candidates)
+            blocks = []
+            for position, student_id in enumerate(snapshot.student_ids):
+                if student_id in key:
+                    start = snapshot.starts[position]
+                    end = start + self._counts[position]
+                    blocks.append((start, end))
+                    sub._positions[student_id] = len(sub._student_ids)
+                    sub._student_ids.append(student_id)
+                    sub._counts.append(end - start)
+
+            if blocks:
+                sub._buffer = np.ascontiguousarray(np.concatenate([snapshot.matrix[a:b] for a, b in blocks]))
+                if snapshot.scales is not None:
+                    sub._scales = np.concatenate([snapshot.scales[a:b] for a, b in blocks])
+                sub._size = sub._buffer.shape[0]
+            sub._publish()
+
+            if len(self._subsets) >= self.MAX_CACHED_SUBSETS:
+                self._subsets.pop(next(iter(self._subsets)))
+            self._subsets[key] = sub
+            return sub
+
+    def rebuild_index(self):
+        """Retrain the attached index on the current gallery and reassign every row"""
+        with self._lock:
+            if self.index is None:
+                return
+            self._compact()
+            # Train a copy: published snapshots keep the centroids their row lists were assigned with
+            index = copy.copy(self.index)
+            index.train(self._rows(0, self._size))
+            self._lists = index.assign(self._rows(0, self._size))
+            self.index = index
+            self._publish()
+
+    def add(self, student_id, embeddings):
+        """
+        Add embeddings for a student, keeping that student's rows contiguous
+
+        Args:
+            student_id: Student ID
+            embeddings: List/array of embeddings (n, dim)
+        """
+        rows = self.normalize(embeddings)
+        if rows.shape[0] == 0:
+            return
+
+        with self._lock:
+            position = self._positions.get(student_id)
+            if position is not None and position != len(self._student_ids) - 1:
+                # Move the student's block to the end so new rows stay adjacent
+                start = self._snapshot.starts[position]
+                rows = np.vstack((self._rows(start, start + self._counts[position]), rows))
+                self._remove_blocks([position])
+                position = None
+            if position is None:
+                self._append_student(student_id, rows)
+            else:
+                self._append_rows(rows)
+                self._counts[-1] += rows.shape[0]
+            self._compact_if_fragmented()
+            self._publish()
+            self._invalidate_subsets({student_id})
+
+    def replace(self, student_id, embeddings):
+        """
+        Swap all embeddings of a student in one step (readers never see the student missing)
+
+        Args:
+            student_id: Student ID
+            embeddings: List/array of embeddings (n, dim)
+        """
+        self.replace_many({student_id: embeddings})
+
+    def replace_many(self, changes):
+        """
+        Swap the embeddings of several students in one step
+
+        Old blocks are marked dead and the new rows appended, so the cost is
+        proportional to the changed rows; readers switch to the result at once.
+
+        Args:
+            changes: Dict of student_id -> embeddings (None or empty removes the student)
+        """
+        changes = {student_id: self.normalize(embeddings) if embeddings is not None and len(embeddings) else None
+                   for student_id, embeddings in changes.items()}
+        if not changes:
+            return
+        with self._lock:
+            self._remove_blocks([self._positions[s] for s in changes if s in self._positions])
+            for student_id, rows in changes.items():
+                if rows is not None:
+                    self._append_student(student_id, rows)
+            self._compact_if_fragmented()
+            self._publish()
+            self._invalidate_subsets(changes)
+
+    def remove(self, student_id):
+        """
+        Remove all embeddings of a student
+
+        Args:
+            student_id: Student ID
+
+        Returns:
+            True if the student was present, False otherwise
+        """
+        with self._lock:
+            if student_id not in self._positions:
+                return False
+            self._remove_blocks([self._positions[student_id]])
+            self._compact_if_fragmented()
+            self._publish()
+            self._invalidate_subsets({student_id})
+            return True
+
+    def student_distances(self, query_embeddings):
+        """
+        Minimum cosine distance from any query embedding to each student
+
+        With an index attached and the gallery above ``min_index_size``, only
+        rows in the probed clusters are scored, so students with no row in
+        those clusters are left out of the result.
+
+        Args:
+            query_embeddings: Array of query embeddings (q, dim)
+
+        Returns:
+            Tuple of (student_ids, distances) where distances[i] belongs to student_ids[i]
+        """
+        student_ids, distances = self._distance_matrix(query_embeddings, [0])
+        return student_ids, distances[:, 0]
+
+    def match(self, query_embeddings):
+        """
+        Find the closest student to a set of query embeddings
+
+        Args:
+            query_embeddings: Array of query embeddings (q, dim)
+
+        Returns:
+            Tuple of (student_id, distance) or (None, inf) if the gallery is empty
+        """
+        return self.match_batch(query_embeddings, [0])[0]
+
+    def match_batch(self, query_embeddings, groups):
+        """
+        Find the closest student for several faces in one matrix multiply
+
+        Args:
+            query_embeddings: Embeddings of all faces stacked together (q, dim)
+            groups: Start row in query_embeddings of each face's embeddings
+                (each face may contribute several, e.g. original + enhanced)
+
+        Returns:
+            List of (student_id, distance) per face, (None, inf) if nothing matched
+        """
+        student_ids, distances = self._distance_matrix(query_embeddings, groups)
+        if len(student_ids) == 0:
+            return [(None, float('inf'))] * len(groups)
+
+        best = np.argmin(distances, axis=0)
+        return [(student_ids[row], float(distances[row, face])) for face, row in enumerate(best)]
+
+    def top_k(self, query_embeddings, groups, k=5):
+        """
+        The k closest students for several faces in one matrix multiply
+
+        Args:
+            query_embeddings: Embeddings of all faces stacked together (q, dim)
+            groups: Start row in query_embeddings of each face's embeddings
+            k: Number of students returned per face
+
+        Returns:
+            List per face of up to k (student_id, distance) tuples, closest first
+        """
+        student_ids, distances = self._distance_matrix(query_embeddings, groups, k)
+        if len(student_ids) == 0:
+            return [[] for _ in groups]
+
+        k = min(k, len(student_ids))
+        nearest = np.argpartition(distances, k - 1, axis=0)[:k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=0), axis=0, kind='stable')
+        nearest = np.take_along_axis(nearest, order, axis=0)
+        return [
+            [(student_ids[row], float(distances[row, face])) for row in nearest[:, face]]
+            for face in range(len(groups))
+        ]
+
+    def _distance_matrix(self, query_embeddings, groups, k=1):
+        """
+        Per-student minimum distance for each face group: (student_ids, distances[students, faces])
+
+        Quantized galleries re-rank at least the k closest students of each face exactly.
+        """
+        snapshot = self._snapshot
+        if not snapshot.student_ids or snapshot.live_ids == []:
+            return [], np.empty((0, len(groups)), dtype=np.float32)
+
+        queries = self.normalize(query_embeddings)
+        groups = np.asarray(groups, dtype=np.int64)
+        if snapshot.row_lists is None or snapshot.matrix.shape[0] < self.min_index_size:
+            similarities = np.maximum.reduceat(self._similarities(snapshot, None, queries), groups, axis=1)
+            student_ids = snapshot.student_ids
+            distances = np.minimum.reduceat(1.0 - similarities, snapshot.starts, axis=0)
+            if snapshot.live is not None:
+                student_ids, distances = snapshot.live_ids, distances[snapshot.live]
+        else:
+            # Approximate search: score only rows that fall in the probed clusters
+            candidates = np.flatnonzero(np.isin(snapshot.row_lists, snapshot.index.probe(queries)))
+            if len(candidates) == 0:
+                return [], np.empty((0, len(groups)), dtype=np.float32)
+
+            similarities = np.maximum.reduceat(self._similarities(snapshot, candidates, queries), groups, axis=1)
+
+            # Candidates are ascending and rows are grouped, so owners are non-decreasing
+            owners = np.searchsorted(snapshot.starts, candidates, side='right') - 1
+            boundaries = np.flatnonzero(np.diff(owners, prepend=-1))
+            blocks = owners[boundaries]
+            distances = np.minimum.reduceat(1.0 - similarities, boundaries, axis=0)
+            if snapshot.live is not None:
+                live = snapshot.live[blocks]
+                blocks, distances = blocks[live], distances[live]
+            student_ids = [snapshot.student_ids[i] for i in blocks]
+
+        if snapshot.matrix.dtype != np.float32 and self.row_source is not None:
+            self._rerank(student_ids, distances, queries, groups, k)
+        return student_ids, distances
+
+    def _similarities(self, snapshot, rows, queries):
+        """Cosine similarity of gallery rows (all, or the given indices) to the queries, decoding codes in chunks"""
+        matrix = snapshot.matrix if rows is None else snapshot.matrix[rows]
+        if matrix.dtype == np.float32:
+            return matrix @ queries.T
+
+        similarities = np.empty((matrix.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], self.DECODE_CHUNK_ROWS):
+            chunk = matrix[start:start + self.DECODE_CHUNK_ROWS]
+            chunk = _decode_float16(chunk) if chunk.dtype == np.float16 else chunk.astype(np.float32)
+            similarities[start:start + chunk.shape[0]] = chunk @ queries.T
+        if snapshot.scales is not None:
+            similarities *= (snapshot.scales if rows is None else snapshot.scales[rows])[:, None]
+        return similarities
+
+    def _rerank(self, student_ids, distances, queries, groups, k=1):
+        """Overwrite the quantized distances of each face's closest students with exact float32 ones"""
+        # rerank_candidates is the safety margin behind the best match; keep it behind the k-th too
+        k = min(self.rerank_candidates + k - 1, len(student_ids))
+        if k == 0:
+            return
+        nearest = np.unique(np.argpartition(distances, k - 1, axis=0)[:k])
+
+        positions, blocks = [], []
+        for position in nearest:
+            rows = self.row_source(student_ids[position])
+            if rows is not None and len(rows):
+                positions.append(position)
+                blocks.append(self.normalize(rows))
+        if not blocks:
+            return
+
+        starts = np.cumsum([0] + [len(block) for block in blocks[:-1]])
+        similarities = np.maximum.reduceat(np.concatenate(blocks) @ queries.T, groups, axis=1)
+        distances[positions] = np.minimum.reduceat(1.0 - similarities, starts, axis=0)
+
+    def _append_rows(self, rows):
+        """Append normalized float32 rows to the buffer, growing capacity geometrically"""
+        required = self._size + rows.shape[0]
+        if required > self._buffer.shape[0]:
+            capacity = max(required, 2 * self._buffer.shape[0], 64)
+            buffer = np.empty((capacity, self.dim), dtype=self._buffer.dtype)
+            buffer[:self._size] = self._buffer[:self._size]
+            self._buffer = buffer
+            if self.quantization == 'int8':
+                scales = np.empty(capacity, dtype=np.float32)
+                scales[:self._size] = self._scales[:self._size]
+                self._scales = scales
+        self._store_rows(self._size, rows)
+
+        if self._index_ready():
+            self._lists = np.concatenate((self._lists[:self._size], self.index.assign(rows)))
+        self._size = required
+
+    def _append_student(self, student_id, rows):
+        """Append a block of normalized rows for a student not in the gallery"""
+        self._positions[student_id] = len(self._student_ids)
+        self._student_ids.append(student_id)
+        self._counts.append(rows.shape[0])
+        self._append_rows(rows)
+
+    def _remove_blocks(self, positions):
+        """Mark students' blocks dead; their rows stay in the buffer until _compact()"""
+        for position in positions:
+            del self._positions[self._student_ids[position]]
+            self._student_ids[position] = None
+            self._dead_rows += self._counts[position]
+
+    def _compact_if_fragmented(self):
+        if self._dead_rows > self.MAX_DEAD_FRACTION * self._size:
+            self._compact()
+
+    def _compact(self):
+        """Drop dead blocks in one pass; builds a new buffer so published snapshots stay valid"""
+        if not self._dead_rows:
+            return
+        keep = np.repeat([student_id is not None for student_id in self._student_ids], self._counts)
+        kept = int(keep.sum())
+
+        buffer = np.empty_like(self._buffer)
+        buffer[:kept] = self._buffer[:self._size][keep]
+        self._buffer = buffer
+        if self.quantization == 'int8':
+            scales = np.empty_like(self._scales)
+            scales[:kept] = self._scales[:self._size][keep]
+            self._scales = scales
+
+        if self._index_ready():
+            self._lists = self._lists[:self._size][keep]
+        self._size = kept
+        self._dead_rows = 0
+        self._counts = [c for c, s in zip(self._counts, self._student_ids) if s is not None]
+        self._student_ids = [s for s in self._student_ids if s is not None]
+        self._positions = {student_id: i for i, student_id in enumerate(self._student_ids)}
+
+    def _publish(self):
+        """Swap in a consistent snapshot for readers"""
+        starts = np.zeros(len(self._counts), dtype=np.int64)
+        if self._counts:
+            starts[1:] = np.cumsum(self._counts[:-1])
+        live = np.array([s is not None for s in self._student_ids], dtype=bool) if self._dead_rows else None
+        self._snapshot = GallerySnapshot(
+            matrix=self._buffer[:self._size],
+            scales=self._scales[:self._size] if self.quantization == 'int8' else None,
+            starts=starts,
+            student_ids=list(self._student_ids),
+            live=live,
+            live_ids=[s for s in self._student_ids if s is not None] if self._dead_rows else None,
+            row_lists=self._lists[:self._size] if self._index_ready() else None,
+            index=self.index if self._index_ready() else None
+        )
+
+    def _store_rows(self, start, rows):
+        """Write normalized float32 rows at buffer position start, quantizing them if enabled"""
+        end = start + rows.shape[0]
+        if self.quantization == 'int8':
+            # Symmetric per-row scale: the largest component maps to +/-127
+            scales = np.abs(rows).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._buffer[start:end] = np.rint(rows / scales[:, None])
+            self._scales[start:end] = scales
+        else:
+            self._buffer[start:end] = rows
+
+    def _rows(self, start, end):
+        """Rows start:end as float32 (decoded when quantized)"""
+        rows = self._buffer[start:end]
+        if self.quantization == 'none':
+            return rows
+        rows = _decode_float16(rows) if rows.dtype == np.float16 else rows.astype(np.float32)
+        if self.quantization == 'int8':
+            rows *= self._scales[start:end, None]
+        return rows
+
+    def _invalidate_subsets(self, student_ids):
+        """Drop cached sub-galleries that contain a changed student"""
+        self._subsets = {key: sub for key, sub in self._subsets.items() if key.isdisjoint(student_ids)}
+
+    def _index_ready(self):
+        return self.index is not None and self.index.trained
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import numpy as np
+from pathlib import Path
+
+
+class IVFIndex:
+    def __init__(self, nlist=0, nprobe=8, iterations=10, seed=0):
+        """
+        Inverted-file (IVF) approximate nearest-neighbour index, pure numpy
+
+        Gallery rows are partitioned into ``nlist`` clusters with spherical
+        k-means. A query is only compared against rows in its ``nprobe``
+        closest clusters, so raising ``nprobe`` trades latency for recall.
+
+        Args:
+            nlist: Number of clusters (0 = auto, about 4 * sqrt(N))
+            nprobe: Clusters searched per query embedding
+            iterations: k-means iterations used when training
+            seed: Random seed for reproducible training
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors):
+        """
+        Learn cluster centroids from L2-normalized vectors
+
+        Args:
+            vectors: Array of normalized embeddings (n, dim)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        count = vectors.shape[0]
+        if count == 0:
+            return
+
+        rng = np.random.default_rng(self.seed)
+        nlist = min(self.nlist or max(1, int(4 * np.sqrt(count))), count)
+
+        # Train on a sample; 64 points per centroid is plenty for k-means
+        sample_size = min(count, nlist * 64)
+        sample = vectors[rng.choice(count, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind='stable')
+            sizes = np.bincount(labels, minlength=nlist)
+            filled = np.flatnonzero(sizes)
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[filled]
+
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            centroids[filled] = sums
+
+            # Reseed empty clusters from random sample points
+            empty = np.flatnonzero(sizes == 0)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids /= norms
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_size = count
+
+    def assign(self, vectors):
+        """
+        Assign normalized vectors to their closest cluster
+
+        Args:
+            vectors: Array of normalized embeddings (n, dim)
+
+        Returns:
+            int32 array of cluster ids (n,)
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[0] == 0:
+            return np.empty(0, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def probe(self, queries):
+        """
+        Clusters to search for a set of normalized query embeddings
+
+        Args:
+            queries: Array of normalized query embeddings (q, dim)
+
+        Returns:
+            Sorted array of unique cluster ids
+        """
+        similarities = np.atleast_2d(queries) @ self.centroids.T
+        nprobe = min(self.nprobe, self.centroids.shape[0])
+        if nprobe == self.centroids.shape[0]:
+            return np.arange(nprobe, dtype=np.int32)
+        closest = np.argpartition(-similarities, nprobe - 1, axis=1)[:, :nprobe]
+        return np.unique(closest).astype(np.int32)
+
+    def save(self, path, row_lists, student_ids):
+        """
+        Persist centroids and row assignments
+
+        Args:
+            path: Destination .npz file
+            row_lists: Cluster id of every gallery row
+            student_ids: Gallery student order, used to validate on load
+        """
+        path = Path(path)
+        # Every inference worker saves; each writes its own file before the atomic rename
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.stem + '.', suffix='.tmp.npz',
+                                         delete=False) as temp:
+            try:
+                np.savez(
+                    temp,
+                    centroids=self.centroids,
+                    trained_size=np.int64(self.trained_size),
+                    row_lists=np.asarray(row_lists, dtype=np.int32),
+                    student_ids=np.asarray([str(s) for s in student_ids], dtype=str)
+                )
+            except Exception:
+                temp.close()
+                os.unlink(temp.name)
+                raise
+        os.replace(temp.name, path)
+
+    @classmethod
+    def load(cls, path, nlist=0, nprobe=8):
+        """
+        Load a persisted index
+
+        Args:
+            path: .npz file written by save()
+            nlist: Configured cluster count; a mismatch forces a rebuild
+            nprobe: Clusters searched per query
+
+        Returns:
+            Tuple of (index, row_lists, student_ids) or None if unavailable
+        """
+        path = Path(path)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path) as data:
+                index = cls(nlist=nlist, nprobe=nprobe)
+                index.centroids = data['centroids']
+                index.trained_size = int(data['trained_size'])
+                if nlist and index.centroids.shape[0] != nlist:
+                    return None
+                return index, data['row_lists'], data['student_ids'].tolist()
+        except Exception as e:
+            print(f"Face index load warning: {str(e)}, rebuilding")
+            return None
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+from config import Config
+
+# Crops are scored at a fixed size so sharpness does not depend on distance
+QUALITY_SIZE = 64
+
+
+def score_face(crop, landmarks=None):
+    """
+    Cheap quality score of a face crop, used to pick which crop to recognize
+
+    Every component is in [0, 1] and the score is their product, so a crop
+    that is blurry, tiny, badly exposed or in profile scores low even if it
+    is fine otherwise.
+
+    Args:
+        crop: BGR face (or person) crop
+        landmarks: Optional five landmarks (right eye, left eye, nose, mouth
+            corners) in any consistent coordinates; NaN values are ignored
+
+    Returns:
+        Dict with score, sharpness, size, brightness and pose (None without landmarks)
+    """
+    if crop is None or crop.size == 0:
+        return {'score': 0.0, 'sharpness': 0.0, 'size': 0.0, 'brightness': 0.0, 'pose': None}
+
+    height, width = crop.shape[:2]
+    gray = cv2.cvtColor(cv2.resize(crop, (QUALITY_SIZE, QUALITY_SIZE), interpolation=cv2.INTER_AREA),
+                        cv2.COLOR_BGR2GRAY)
+
+    # Variance of the Laplacian drops quickly with motion blur and defocus
+    sharpness = min(1.0, cv2.Laplacian(gray, cv2.CV_32F).var() / Config.FACE_QUALITY_SHARPNESS_REF)
+    size = min(1.0, min(height, width) / Config.FACE_QUALITY_SIZE_REF)
+    brightness = max(0.0, 1.0 - abs(float(gray.mean()) - 128.0) / 128.0)
+    pose = landmark_pose(landmarks)
+
+    score = sharpness * size * brightness * (1.0 if pose is None else pose)
+    return {'score': score, 'sharpness': sharpness, 'size': size, 'brightness': brightness, 'pose': pose}
+
+
+def landmark_pose(landmarks):
+    """
+    Frontalness in [0, 1] from the nose position between the eyes (1 = frontal)
+
+    Args:
+        landmarks: Five landmarks (right eye, left eye, nose, mouth corners) or None
+
+    Returns:
+        Frontalness, or None if the landmarks are missing
+    """
+    if landmarks is None:
+        return None
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    if landmarks.shape != (5, 2) or not np.isfinite(landmarks).all():
+        return None
+
+    right_eye, left_eye, nose = landmarks[0], landmarks[1], landmarks[2]
+    eye_distance = float(np.linalg.norm(left_eye - right_eye))
+    if eye_distance < 1e-6:
+        return 0.0
+    # In a profile view the nose moves towards (and past) one eye
+    offset = abs(float(nose[0] - (right_eye[0] + left_eye[0]) / 2))
+    return max(0.0, 1.0 - offset / (eye_distance / 2))
@@ -1,9 +1,15 @@
-import os
-import pickle
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import numpy as np
-from deepface import DeepFace
-from pathlib import Path
 from config import Config
+from face_gallery import FaceGallery
+from gallery_store import GalleryStore
+from face_index import IVFIndex
+from face_embedder import FaceEmbedder
+from face_consolidation import consolidate_embeddings, consolidate_store
 import cv2
 
 class FaceRecognizer:
@@ -13,37 +19,213 @@ class FaceRecognizer:
         self.model_name = "Facenet512"  # Options: VGG-Face, Facenet, Facenet512, OpenFace, DeepFace, DeepID, ArcFace, Dlib
         self.database_path = Config.UPLOAD_FOLDER
         self.encodings_file = Config.MODELS_FOLDER / "face_encodings.pkl"
-        self.face_database = self.load_face_database()
+        self.embedder = FaceEmbedder(self.model_name)
+        # In 'box' mode crops from FaceDetector are trusted as tight face boxes and
+        # only resized to the model input, skipping DeepFace's second detection
+        self.crop_detector = 'skip' if Config.FACE_ALIGNMENT_MODE == 'box' else None
+        self.enhancement_stats = {'faces': 0, 'enhanced': 0}
+        # Recognition runs on many request threads; += on the counters is not atomic
+        self._stats_lock = threading.Lock()
+        self.store = GalleryStore(Config.GALLERY_FOLDER, dtype=Config.GALLERY_STORE_DTYPE,
+                                  compact_ratio=Config.GALLERY_COMPACT_RATIO)
+        self.migrate_face_database()
+        self.index_file = Config.MODELS_FOLDER / "face_index.npz"
+        self._index_dirty = False
+        # Serializes gallery writers (enroll/delete/reload); recognition reads
+        # self.gallery's published snapshot and never takes this lock
+        self._write_lock = threading.RLock()
+        self.gallery = self.load_face_database()
+        if Config.FACE_INDEX_MODE == 'ivf':
+            self._attach_index()
+            self.start_index_saver(Config.FACE_INDEX_SAVE_INTERVAL)
+        if Config.GALLERY_RELOAD_INTERVAL > 0:
+            self.start_gallery_watcher(Config.GALLERY_RELOAD_INTERVAL)
 
     def load_face_database(self):
-        """Load pre-computed face encodings from file"""
-        if self.encodings_file.exists():
-            with open(self.encodings_file, 'rb') as f:
-                return pickle.load(f)
-        return {}
-
-    def save_face_database(self):
-        """Save face encodings to file"""
-        with open(self.encodings_file, 'wb') as f:
-            pickle.dump(self.face_database, f)
+        """Load enrolled face embeddings from the gallery store (memory-mapped, no copy unless quantized)"""
+        matrix, student_ids, counts = self.store.load()
+        return FaceGallery.from_matrix(matrix, student_ids, counts,
+                                       quantization=Config.GALLERY_QUANTIZATION,
+                                       row_source=self.store.rows,
+                                       rerank_candidates=Config.GALLERY_RERANK_CANDIDATES)
+
+    def reload_face_database(self):
+        """
+        Apply gallery changes made by other processes (workers, enrollment scripts)
+
+        All students changed since the last poll are swapped into the live
+        gallery with a single rebuild. After another process compacted
+        the store a new gallery is built and swapped in as a whole. Either
+        way readers keep matching against a complete snapshot throughout.
+
+        Returns:
+            Number of students updated (-1 after a full reload)
+        """
+        with self._write_lock:
+            reset, student_ids = self.store.changes()
+            if reset:
+                gallery = self.load_face_database()
+                if Config.FACE_INDEX_MODE == 'ivf':
+                    self._attach_index(gallery)
+                self.gallery = gallery
+                return -1
+
+            changes = {}
+            for student_id in student_ids:
+                rows = self.store.rows(student_id)
+                if rows is not None or student_id not in self.store.records:
+                    changes[student_id] = rows
+            self.gallery.replace_many(changes)
+            self.update_face_index()
+            return len(student_ids)
+
+    def start_gallery_watcher(self, interval):
+        """
+        Poll the gallery store for changes from other processes in a background thread
+
+        Args:
+            interval: Seconds between polls
+        """
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    updated = self.reload_face_database()
+                    if updated:
+                        print(f"Gallery reloaded ({'full' if updated < 0 else f'{updated} students'})")
+                except Exception as e:
+                    print(f"Gallery reload warning: {str(e)}")
+
+        thread = threading.Thread(target=watch, name='gallery-watcher', daemon=True)
+        thread.start()
+        return thread
+
+    def migrate_face_database(self):
+        """
+        One-time import of the legacy face_encodings.pkl into the gallery store
+
+        Returns:
+            Number of students migrated (0 if there was nothing to migrate)
+        """
+        if self.store.exists or not self.encodings_file.exists():
+            return 0
+        # Re-checked under the store lock: workers starting together import only once
+        count = self.store.import_pickle(self.encodings_file, FaceGallery.normalize)
+        if count:
+            print(f"Migrated {count} students from {self.encodings_file.name} to the gallery store")
+        return count
+
+    def consolidate_face_database(self, max_embeddings=None):
+        """
+        Cap the embeddings of every student in the gallery (batch consolidation)
+
+        Args:
+            max_embeddings: Per-student cap (defaults to Config.GALLERY_MAX_EMBEDDINGS)
+
+        Returns:
+            Dict with students, consolidated, embeddings_before and embeddings_after
+        """
+        with self._write_lock:
+            report = consolidate_store(self.store, max_embeddings or Config.GALLERY_MAX_EMBEDDINGS,
+                                       Config.GALLERY_CONSOLIDATION_CENTROID)
+            if report['consolidated']:
+                # The store was rewritten; swap in a freshly loaded gallery
+                gallery = self.load_face_database()
+                if Config.FACE_INDEX_MODE == 'ivf':
+                    self._attach_index(gallery)
+                self.gallery = gallery
+            return report
+
+    def _compact_face_database(self):
+        """Compact the gallery store once deletes and re-enrollments have fragmented it"""
+        if self.store.needs_compaction():
+            self.store.compact()
+
+    def _attach_index(self, gallery=None):
+        """Attach the IVF index to the gallery, reusing the persisted one when valid"""
+        gallery = self.gallery if gallery is None else gallery
+        loaded = IVFIndex.load(self.index_file, nlist=Config.FACE_INDEX_NLIST,
+                               nprobe=Config.FACE_INDEX_NPROBE)
+        if loaded:
+            index, row_lists, student_ids = loaded
+            gallery.attach_index(index, Config.FACE_INDEX_MIN_SIZE, row_lists, student_ids)
+        else:
+            index = IVFIndex(nlist=Config.FACE_INDEX_NLIST, nprobe=Config.FACE_INDEX_NPROBE)
+            gallery.attach_index(index, Config.FACE_INDEX_MIN_SIZE)
+        self._index_dirty = True
+        self.update_face_index(gallery)
+        self.save_face_index(gallery)
+
+    def update_face_index(self, gallery=None):
+        """Retrain the IVF index once the gallery has doubled, and mark it for the next save"""
+        gallery = self.gallery if gallery is None else gallery
+        index = gallery.index
+        if index is None:
+            return
+        if not index.trained or len(gallery) > 2 * index.trained_size:
+            gallery.rebuild_index()
+        self._index_dirty = True
+
+    def save_face_index(self, gallery=None):
+        """Persist the IVF index next to the face encodings if it changed since the last save"""
+        gallery = self.gallery if gallery is None else gallery
+        state = gallery.index_state()
+        if not self._index_dirty or state is None:
+            return
+        self._index_dirty = False
+        index, row_lists, student_ids = state
+        index.save(self.index_file, row_lists, student_ids)
+
+    def start_index_saver(self, interval):
+        """
+        Persist the IVF index every interval seconds (if it changed) and at exit
+
+        Rewriting the whole index file on every enrollment would make each
+        enrollment cost disk I/O proportional to the gallery.
+
+        Args:
+            interval: Seconds between saves
+        """
+        def save():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.save_face_index()
+                except Exception as e:
+                    print(f"Face index save warning: {str(e)}")
+
+        atexit.register(self.save_face_index)
+        thread = threading.Thread(target=save, name='face-index-saver', daemon=True)
+        thread.start()
+        return thread
     
-    def _preprocess_image(self, image_path):
+    def _load_image(self, face_image):
+        """
+        Get a BGR image array from a path or an in-memory array
+
+        Args:
+            face_image: Path to an image file, or a BGR numpy array (e.g. a face crop)
+
+        Returns:
+            BGR numpy array, or None if the image could not be read
+        """
+        if isinstance(face_image, np.ndarray):
+            return face_image if face_image.size else None
+        return cv2.imread(str(face_image))
+
+    def _preprocess_image(self, image):
         """
         Preprocess image to improve recognition in varying conditions
-        
+
         Args:
-            image_path: Path to image
-            
+            image: BGR numpy array
+
         Returns:
-            Preprocessed image path
+            Enhanced BGR numpy array, or None if preprocessing failed
         """
         try:
-            img = cv2.imread(str(image_path))
-            if img is None:
-                return image_path
-            
             # Convert to LAB color space
-            lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+            lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
             l, a, b = cv2.split(lab)
             
             # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization) to L channel
@@ -52,78 +234,56 @@ class FaceRecognizer:
             
             # Merge channels and convert back to BGR
             enhanced = cv2.merge([l, a, b])
-            enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
-            
-            # Save temporarily
-            temp_path = str(image_path).replace('.jpg', '_enhanced.jpg')
-            cv2.imwrite(temp_path, enhanced)
-            
-            return temp_path
+            return cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
         except Exception as e:
             print(f"Preprocessing warning: {str(e)}, using original image")
-            return image_path
+            return None
 
-    def enroll_face(self, student_id, face_image_path):
+    def enroll_face(self, student_id, face_image):
         """
         Enroll a new face to the database with multiple embeddings for robustness
 
         Args:
             student_id: Student ID
-            face_image_path: Path to the face image
+            face_image: Path to the face image, or a BGR numpy array
 
         Returns:
             True if successful, False otherwise
         """
         try:
-            embeddings = []
-            
-            # Generate embedding from original image
-            embedding_objs = DeepFace.represent(
-                img_path=str(face_image_path),
-                model_name=self.model_name,
-                enforce_detection=True,
-                detector_backend='opencv'  # Faster, works with various angles
-            )
-
-            if embedding_objs:
-                embeddings.append(embedding_objs[0]["embedding"])
-            
-            # Generate embedding from preprocessed image for better lighting tolerance
-            enhanced_path = self._preprocess_image(face_image_path)
-            if enhanced_path != face_image_path:
-                try:
-                    enhanced_objs = DeepFace.represent(
-                        img_path=enhanced_path,
-                        model_name=self.model_name,
-                        enforce_detection=False,
-                        detector_backend='opencv'
-                    )
-                    if enhanced_objs:
-                        embeddings.append(enhanced_objs[0]["embedding"])
-                    # Clean up temp file
-                    if os.path.exists(enhanced_path):
-                        os.remove(enhanced_path)
-                except:
-                    pass
+            image = self._load_image(face_image)
+            if image is None:
+                print("Error enrolling face: could not read image")
+                return False
+
+            image_path = None if isinstance(face_image, np.ndarray) else str(face_image)
+            faces = self._enrollment_faces(image)
+
+            # Both variants go through the model in a single batch
+            embeddings = FaceGallery.normalize(self.embedder.embed(faces))
             
-            if embeddings:
-                # Store multiple embeddings or average them
-                if student_id in self.face_database:
-                    # Append to existing embeddings
-                    existing = self.face_database[student_id].get('embeddings', [self.face_database[student_id]['embedding']])
-                    existing.extend(embeddings)
-                    self.face_database[student_id] = {
-                        'embeddings': existing,
-                        'embedding': embeddings[0],  # Keep for backward compatibility
-                        'image_path': str(face_image_path)
-                    }
-                else:
-                    self.face_database[student_id] = {
-                        'embeddings': embeddings,
-                        'embedding': embeddings[0],  # Primary embedding
-                        'image_path': str(face_image_path)
-                    }
-                self.save_face_database()
+            if len(embeddings):
+                def merge(existing):
+                    cap = Config.GALLERY_MAX_EMBEDDINGS
+                    if cap and existing is not None and len(existing) + len(embeddings) > cap:
+                        # Re-enrollment would exceed the cap: keep a diverse set of prototypes instead
+                        combined = np.vstack((existing, embeddings))
+                        prototypes = consolidate_embeddings(combined, cap, Config.GALLERY_CONSOLIDATION_CENTROID)
+                        print(f"Consolidated {student_id}: {len(combined)} -> {len(prototypes)} embeddings")
+                        return prototypes, True
+                    # New embeddings are appended to any the student already has
+                    return embeddings, False
+
+                with self._write_lock:
+                    # Read and write back under the store's cross-process lock, so
+                    # rows another worker appends meanwhile are not lost
+                    rows, replaced = self.store.update(student_id, merge, image_path)
+                    if replaced:
+                        self.gallery.replace(student_id, rows)
+                    else:
+                        self.gallery.add(student_id, rows)
+                    self._compact_face_database()
+                    self.update_face_index()
                 return True
 
             return False
@@ -131,82 +291,308 @@ class FaceRecognizer:
             print(f"Error enrolling face: {str(e)}")
             return False
 
-    def recognize_face(self, face_image_path):
+    def enroll_faces(self, items):
+        """
+        Enroll many images at once (bulk onboarding)
+
+        Images are read and preprocessed by a thread pool and embedded in
+        batches, a chunk at a time so memory stays bounded. All embeddings
+        are written to the gallery store in a single append at the end.
+
+        Args:
+            items: Iterable of (student_id, face_image, label) tuples; face_image is a
+                path or BGR array, label names the image in the report (e.g. file name)
+
+        Returns:
+            List of {'file', 'student_id', 'success', 'error'} dicts, one per item
+        """
+        report = []
+        new_embeddings = {}
+        image_paths = {}
+        items = iter(items)
+
+        with ThreadPoolExecutor(max_workers=Config.BULK_ENROLL_WORKERS) as pool:
+            while True:
+                chunk = list(islice(items, Config.BULK_ENROLL_CHUNK))
+                if not chunk:
+                    break
+
+                prepared = list(pool.map(self._prepare_enrollment, chunk))
+                faces = [face for _, item_faces in prepared for face in item_faces]
+                embeddings = FaceGallery.normalize(self.embedder.embed(faces)) if faces else []
+
+                position = 0
+                for (student_id, face_image, label), (error, item_faces) in zip(chunk, prepared):
+                    report.append({'file': label, 'student_id': student_id,
+                                   'success': error is None, 'error': error})
+                    if error is None:
+                        new_embeddings.setdefault(student_id, []).append(
+                            embeddings[position:position + len(item_faces)])
+                        if not isinstance(face_image, np.ndarray):
+                            image_paths.setdefault(student_id, str(face_image))
+                    position += len(item_faces)
+
+        if not new_embeddings:
+            return report
+
+        def merge(blocks):
+            def update(existing):
+                combined = np.vstack(blocks if existing is None else [existing] + blocks)
+                if cap and len(combined) > cap:
+                    combined = consolidate_embeddings(combined, cap, Config.GALLERY_CONSOLIDATION_CENTROID)
+                return combined, True
+            return update
+
+        cap = Config.GALLERY_MAX_EMBEDDINGS
+        with self._write_lock:
+            # Each student's final embeddings (existing + new, capped) replace the old ones in one
+            # write, read and written under the store's cross-process lock
+            self.store.update_many([
+                (student_id, merge(blocks), image_paths.get(student_id))
+                for student_id, blocks in new_embeddings.items()
+            ])
+            self._compact_face_database()
+
+            gallery = self.load_face_database()
+            if Config.FACE_INDEX_MODE == 'ivf':
+                self._attach_index(gallery)
+            self.gallery = gallery
+
+        return report
+
+    def _enrollment_faces(self, image):
+        """
+        Model-ready face tensors for enrolling an image: the original and, if
+        possible, the CLAHE-enhanced variant
+
+        Raises:
+            ValueError: If no face is detected in the original image
+        """
+        # Original image must contain a detectable face
+        faces = [self.embedder.preprocess(image, enforce_detection=True)]
+
+        # Add preprocessed image for better lighting tolerance
+        enhanced = self._preprocess_image(image)
+        if enhanced is not None:
+            try:
+                faces.append(self.embedder.preprocess(enhanced))
+            except Exception:
+                pass
+        return faces
+
+    def _prepare_enrollment(self, item):
+        """Read and preprocess one bulk enrollment item: (error or None, faces)"""
+        _, face_image, _ = item
+        try:
+            image = self._load_image(face_image)
+            if image is None:
+                return "Could not read image", []
+            return None, self._enrollment_faces(image)
+        except Exception as e:
+            return str(e), []
+
+    def recognize_face(self, face_image, candidates=None):
         """
         Recognize a face from the database with improved tolerance for varying conditions
 
+        Images are processed in memory; nothing is written to disk.
+
         Args:
-            face_image_path: Path to the face image to recognize
+            face_image: Path to the face image, or a BGR numpy array (e.g. a crop
+                from FaceDetector.extract_face)
+            candidates: Optional set of student IDs to restrict the search to
+                (e.g. the roster of the active course)
 
         Returns:
             Tuple of (student_id, confidence) or (None, 0) if not recognized
         """
+        return self.recognize_faces([face_image], candidates)[0]
+
+    def recognize_faces(self, face_images, candidates=None, tight_boxes=False):
+        """
+        Recognize every face of a frame with one batched model pass
+
+        Args:
+            face_images: List of face image paths or BGR numpy arrays
+            candidates: Optional set of student IDs to restrict the search to
+            tight_boxes: Crops come from a face detector; skip the second face detection
+
+        Returns:
+            List of (student_id, confidence) per face, (None, 0) if not recognized
+        """
+        return [
+            (result['student_id'], result['confidence'])
+            for result in self.recognize_faces_top_k(face_images, candidates, k=1, tight_boxes=tight_boxes)
+        ]
+
+    def recognize_faces_top_k(self, face_images, candidates=None, k=5, tight_boxes=False):
+        """
+        Recognize faces and report the k closest students of each
+
+        The original and CLAHE-enhanced variant of every face are embedded
+        together, then all faces are matched against the gallery in one
+        vectorized step. With FACE_ENHANCEMENT_MODE='adaptive', the enhanced
+        variant is only embedded for poorly lit crops up front, and in a
+        second batch for faces whose first-pass distance is ambiguous.
+
+        Args:
+            face_images: List of face image paths or BGR numpy arrays
+            candidates: Optional set of student IDs to restrict the search to
+            k: Number of closest students reported per face
+            tight_boxes: Crops come from a face detector; skip the second face detection
+
+        Returns:
+            List per face of dicts with student_id and confidence of the accepted
+            match (None and 0 if below the threshold), distance of the closest
+            student, whether the enhanced variant was used, and the top-k
+            candidates as [{'student_id', 'distance', 'confidence'}, ...]
+        """
+        results = [
+            {'student_id': None, 'confidence': 0, 'distance': None, 'enhanced': False, 'candidates': []}
+            for _ in face_images
+        ]
         try:
-            input_embeddings = []
-            
-            # Generate embedding for the input face (original)
-            embedding_objs = DeepFace.represent(
-                img_path=str(face_image_path),
-                model_name=self.model_name,
-                enforce_detection=False,
-                detector_backend='opencv'
-            )
-
-            if embedding_objs:
-                input_embeddings.append(np.array(embedding_objs[0]["embedding"]))
-            
-            # Try with enhanced image for better lighting tolerance
-            enhanced_path = self._preprocess_image(face_image_path)
-            if enhanced_path != face_image_path:
-                try:
-                    enhanced_objs = DeepFace.represent(
-                        img_path=enhanced_path,
-                        model_name=self.model_name,
-                        enforce_detection=False,
-                        detector_backend='opencv'
-                    )
-                    if enhanced_objs:
-                        input_embeddings.append(np.array(enhanced_objs[0]["embedding"]))
-                    if os.path.exists(enhanced_path):
-                        os.remove(enhanced_path)
-                except:
-                    pass
-            
-            if not input_embeddings:
-                return None, 0
-
-            # Compare with all enrolled faces using minimum distance across all embeddings
-            best_match = None
-            best_distance = float('inf')
-
-            for student_id, data in self.face_database.items():
-                # Get all stored embeddings for this student
-                stored_embeddings = data.get('embeddings', [data['embedding']])
-                
-                # Compare each input embedding with each stored embedding
-                min_distance = float('inf')
-                for input_emb in input_embeddings:
-                    for stored_emb in stored_embeddings:
-                        stored_embedding = np.array(stored_emb)
-                        distance = self._cosine_distance(input_emb, stored_embedding)
-                        min_distance = min(min_distance, distance)
-                
-                if min_distance < best_distance:
-                    best_distance = min_distance
-                    best_match = student_id
-
-            # Check if best match is below threshold
-            if best_match and best_distance < self.threshold:
-                confidence = 1 - best_distance  # Convert distance to confidence
-                print(f"Face recognition result: student_id={best_match}, confidence={confidence:.2f}, distance={best_distance:.3f}")
-                return best_match, confidence
-
-            print(f"Face recognition result: student_id=None, confidence=0, best_distance={best_distance:.3f}, threshold={self.threshold}")
-            return None, 0
+            adaptive = Config.FACE_ENHANCEMENT_MODE == 'adaptive'
+            crop_detector = 'skip' if tight_boxes else self.crop_detector
+            images = {}
+            variants = {}
+            enhanced = set()
+            for i, face_image in enumerate(face_images):
+                image = self._load_image(face_image)
+                if image is None:
+                    continue
+
+                images[i] = image
+                variants[i] = [self._prepare_face(image, crop_detector)]
+                if not adaptive or self._is_poorly_lit(image):
+                    variants[i].append(self._prepare_face(self._preprocess_image(image), crop_detector))
+                    enhanced.add(i)
+
+            embeddings = self._embed_variants(variants)
+            if not embeddings:
+                return results
+
+            # Compare every face with all enrolled faces in one matrix multiply,
+            # taking the minimum distance across each student's stored embeddings
+            gallery = self.gallery if candidates is None else self.gallery.subset(candidates)
+            matches = self._match_embeddings(gallery, embeddings, k)
+
+            if adaptive:
+                # Second pass only where the first distance is close to the threshold
+                band = Config.FACE_ENHANCEMENT_BAND
+                ambiguous = {
+                    i: [self._prepare_face(self._preprocess_image(images[i]), crop_detector)]
+                    for i, top in matches.items()
+                    if i not in enhanced and top and abs(top[0][1] - self.threshold) <= band
+                }
+                second_pass = self._embed_variants(ambiguous)
+                for i, extra in second_pass.items():
+                    embeddings[i] = np.vstack((embeddings[i], extra))
+                    enhanced.add(i)
+                if second_pass:
+                    matches.update(self._match_embeddings(
+                        gallery, {i: embeddings[i] for i in second_pass}, k
+                    ))
+
+            with self._stats_lock:
+                self.enhancement_stats['faces'] += len(embeddings)
+                self.enhancement_stats['enhanced'] += len(enhanced & set(embeddings))
+
+            for i, top in matches.items():
+                result = results[i]
+                result['enhanced'] = i in enhanced
+                result['candidates'] = [
+                    {'student_id': student_id, 'distance': distance, 'confidence': max(0.0, 1 - distance)}
+                    for student_id, distance in top
+                ]
+                if not top:
+                    continue
+
+                best_match, best_distance = top[0]
+                result['distance'] = best_distance
+                # Check if best match is below threshold
+                if best_distance < self.threshold:
+                    confidence = 1 - best_distance  # Convert distance to confidence
+                    print(f"Face recognition result: student_id={best_match}, confidence={confidence:.2f}, distance={best_distance:.3f}")
+                    result['student_id'] = best_match
+                    result['confidence'] = confidence
+                else:
+                    print(f"Face recognition result: student_id=None, confidence=0, best_distance={best_distance:.3f}, threshold={self.threshold}")
+
+            return results
 
         except Exception as e:
             print(f"Error recognizing face: {str(e)}")
-            return None, 0
+            return results
+
+    def get_enhancement_stats(self):
+        """
+        How often the CLAHE-enhanced second embedding was computed
+
+        Returns:
+            Dict with face count, enhanced count and enhanced rate
+        """
+        with self._stats_lock:
+            faces = self.enhancement_stats['faces']
+            enhanced = self.enhancement_stats['enhanced']
+        return {
+            'mode': Config.FACE_ENHANCEMENT_MODE,
+            'faces': faces,
+            'enhanced': enhanced,
+            'enhanced_rate': enhanced / faces if faces else 0.0
+        }
+
+    def _is_poorly_lit(self, image):
+        """Check crop luminance statistics for dark, washed-out or low-contrast lighting"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        mean, std = cv2.meanStdDev(gray)
+        brightness, contrast = float(mean[0][0]), float(std[0][0])
+        return (brightness < Config.FACE_MIN_BRIGHTNESS
+                or brightness > Config.FACE_MAX_BRIGHTNESS
+                or contrast < Config.FACE_MIN_CONTRAST)
+
+    def _prepare_face(self, image, crop_detector=None):
+        """Preprocess one image variant for the embedder, or None if it failed"""
+        if image is None:
+            return None
+        try:
+            return self.embedder.preprocess(image, detector_backend=crop_detector or self.crop_detector)
+        except Exception as e:
+            print(f"Face preprocessing warning: {str(e)}")
+            return None
+
+    def _embed_variants(self, variants):
+        """
+        Embed the prepared variants of several faces in one batch
+
+        Args:
+            variants: Dict of face index -> list of prepared tensors (None entries skipped)
+
+        Returns:
+            Dict of face index -> embeddings array (n_variants, dim), faces without
+            any usable variant are left out
+        """
+        owners = []
+        faces = []
+        for i, tensors in variants.items():
+            for tensor in tensors:
+                if tensor is not None:
+                    owners.append(i)
+                    faces.append(tensor)
+        if not faces:
+            return {}
+
+        embeddings = {}
+        for i, embedding in zip(owners, self.embedder.embed(faces)):
+            embeddings.setdefault(i, []).append(embedding)
+        return {i: np.array(rows) for i, rows in embeddings.items()}
+
+    def _match_embeddings(self, gallery, embeddings, k=1):
+        """Match several faces' embeddings in one vectorized step: dict of face index -> top-k [(student_id, distance)]"""
+        owners = list(embeddings)
+        groups = np.cumsum([0] + [len(embeddings[i]) for i in owners[:-1]])
+        stacked = np.vstack([embeddings[i] for i in owners])
+        return dict(zip(owners, gallery.top_k(stacked, groups, k)))
 
     def _cosine_distance(self, vec1, vec2):
         """Calculate cosine distance between two vectors"""
@@ -232,8 +618,10 @@ class FaceRecognizer:
         Returns:
             True if successful, False otherwise
         """
-        if student_id in self.face_database:
-            del self.face_database[student_id]
-            self.save_face_database()
-            return True
-        return False
+        with self._write_lock:
+            if self.store.delete(student_id):
+                self.gallery.remove(student_id)
+                self._compact_face_database()
+                self.update_face_index()
+                return True
+            return False
@@ -0,0 +1,252 @@
+import itertools
+
+import numpy as np
+
+from face_detector import box_iou, match_boxes
+
+
+class Track:
+    # Constant-velocity model over [cx, cy, w, h] and their per-frame velocities
+    _transition = np.eye(8) + np.eye(8, k=4)
+    _projection = np.eye(4, 8)
+    # Noise relative to the box size, so small and large faces track alike
+    _position_noise = 1 / 20
+    _velocity_noise = 1 / 160
+
+    def __init__(self, track_id, box, frame_index):
+        """
+        One tracked person: Kalman-filtered box plus the identity recognized for it
+
+        Args:
+            track_id: Stable ID of the track
+            box: First detected box (x1, y1, x2, y2)
+            frame_index: Frame the track was created in
+        """
+        self.track_id = track_id
+        self.detection = tuple(box)  # Latest detected box, used for recognition crops
+        self.detection_index = None  # Index of that box among the frame's detections
+        measurement = self._measurement(box)
+        self.mean = np.concatenate((measurement, np.zeros(4)))
+        size = max(measurement[2], measurement[3])
+        self.covariance = np.diag(np.square(np.r_[
+            [2 * self._position_noise * size] * 4, [10 * self._velocity_noise * size] * 4
+        ]))
+        self.hits = 1
+        self.missed = 0
+        self.first_seen = frame_index
+        self.last_seen = frame_index
+
+        # Identity carried across frames
+        self.student_id = None
+        self.confidence = 0
+        self.label = None
+        self.recognized_at = None
+        self.attempted_at = None
+        self.attempts = 0
+
+        # Best crop of the current quality window
+        self.best_crop = None
+        self.best_quality = None
+        self.window_start = None
+
+    @property
+    def best_score(self):
+        """Quality score of the buffered crop (0 if there is none)"""
+        return self.best_quality['score'] if self.best_quality else 0.0
+
+    @property
+    def box(self):
+        """Current box estimate (x1, y1, x2, y2) in integer pixels"""
+        cx, cy, w, h = self.mean[:4]
+        return (int(cx - w / 2), int(cy - h / 2), int(cx + w / 2), int(cy + h / 2))
+
+    @staticmethod
+    def _measurement(box):
+        x1, y1, x2, y2 = box
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, max(x2 - x1, 1), max(y2 - y1, 1)], dtype=np.float64)
+
+    def predict(self):
+        """Advance the box estimate by one frame"""
+        size = max(self.mean[2], self.mean[3])
+        noise = np.diag(np.square(np.r_[[self._position_noise * size] * 4, [self._velocity_noise * size] * 4]))
+        self.mean = self._transition @ self.mean
+        self.mean[2:4] = np.maximum(self.mean[2:4], 1)
+        self.covariance = self._transition @ self.covariance @ self._transition.T + noise
+        self.missed += 1
+
+    def update(self, box, frame_index):
+        """Correct the estimate with a matched detection"""
+        self.detection = tuple(box)
+        measurement = self._measurement(box)
+        size = max(measurement[2], measurement[3])
+        noise = np.diag(np.square([self._position_noise * size] * 4))
+        projected = self._projection @ self.covariance @ self._projection.T + noise
+        gain = self.covariance @ self._projection.T @ np.linalg.inv(projected)
+        self.mean = self.mean + gain @ (measurement - self._projection @ self.mean)
+        self.covariance = (np.eye(8) - gain @ self._projection) @ self.covariance
+        self.hits += 1
+        self.missed = 0
+        self.last_seen = frame_index
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_age=30, high_score=0.6, retry_frames=10, reverify_frames=1800,
+                 window_frames=1):
+        """
+        IoU/Kalman multi-object tracker (ByteTrack-style) for one camera
+
+        Detections are associated with the Kalman-predicted boxes of the
+        existing tracks by IoU; confident detections are matched first, then
+        weaker ones may only extend existing tracks. The recognized identity
+        and label stay on the track, so a person is recognized once when the
+        track appears and then only re-verified periodically. Crops offered
+        for a track are buffered and only the best one is recognized: a
+        track waits until its buffer spans ``window_frames`` frames, and the
+        buffer restarts after ``retry_frames`` so the chosen crop stays recent.
+
+        Args:
+            iou_threshold: Minimum IoU between a predicted box and a detection
+            max_age: Frames a track survives without a matching detection
+            high_score: Detections at or above this score may start tracks
+            retry_frames: Frames between recognition attempts of an unresolved track
+            reverify_frames: Frames after which a recognized track is recognized again
+            window_frames: Minimum frames over which the best crop of a track is chosen
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.high_score = high_score
+        self.retry_frames = retry_frames
+        self.reverify_frames = reverify_frames
+        self.window_frames = max(1, window_frames)
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self.stats = {'frames': 0, 'detections': 0, 'tracks': 0, 'recognitions': 0,
+                      'skipped_low_quality': 0, 'recognized_quality': 0.0}
+
+    def update(self, boxes, frame_index, scores=None):
+        """
+        Advance all tracks by one frame and associate the new detections
+
+        Args:
+            boxes: Detected boxes [(x1, y1, x2, y2), ...]
+            frame_index: Index of the frame the boxes come from
+            scores: Optional detector confidence per box (all treated as confident if None)
+
+        Returns:
+            Tracks matched in this frame, in detection order; each track's
+            detection_index is the index of its box in ``boxes``
+        """
+        for track in self.tracks:
+            track.predict()
+
+        boxes = list(boxes)
+        scores = np.ones(len(boxes)) if scores is None else np.asarray(scores, dtype=np.float64)
+        confident = [i for i in range(len(boxes)) if scores[i] >= self.high_score]
+        weak = [i for i in range(len(boxes)) if scores[i] < self.high_score]
+
+        assigned = {}
+        remaining = list(range(len(self.tracks)))
+        for detections in (confident, weak):
+            if not detections or not remaining:
+                continue
+            iou = box_iou([self.tracks[t].box for t in remaining], [boxes[i] for i in detections])
+            matched = match_boxes(iou, self.iou_threshold)
+            for row, column in matched:
+                assigned[detections[column]] = self.tracks[remaining[row]]
+            taken = {remaining[row] for row, _ in matched}
+            remaining = [t for t in remaining if t not in taken]
+
+        for i, track in assigned.items():
+            track.update(boxes[i], frame_index)
+        for i in confident:
+            if i not in assigned:
+                assigned[i] = Track(next(self._ids), boxes[i], frame_index)
+                self.tracks.append(assigned[i])
+                self.stats['tracks'] += 1
+        for i, track in assigned.items():
+            track.detection_index = i
+
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_age]
+        self.stats['frames'] += 1
+        self.stats['detections'] += len(boxes)
+        return [assigned[i] for i in sorted(assigned)]
+
+    def offer(self, track, crop, quality, frame_index):
+        """
+        Buffer a crop of a track if it is the best since the buffer started
+
+        Args:
+            track: Track the crop belongs to
+            crop: Face crop (copied only when kept, as frames are drawn on later)
+            quality: Quality dict with a 'score' (face_quality.score_face)
+            frame_index: Index of the current frame
+        """
+        if track.window_start is None or frame_index - track.window_start >= max(self.window_frames, self.retry_frames):
+            # Restart the buffer so the chosen crop stays recent
+            track.window_start = frame_index
+            track.best_crop, track.best_quality = None, None
+        if track.best_quality is None or quality['score'] > track.best_quality['score']:
+            track.best_crop = crop.copy()
+            track.best_quality = quality
+
+    def due(self, tracks, frame_index):
+        """
+        Tracks that need recognition in this frame
+
+        New tracks are due immediately, unresolved ones every retry_frames,
+        and recognized ones again after reverify_frames; a track also waits
+        until its crop buffer spans window_frames, so the best crop is used.
+
+        Args:
+            tracks: Tracks visible in the frame (output of update())
+            frame_index: Index of the current frame
+
+        Returns:
+            List of tracks to recognize
+        """
+        due = []
+        for track in tracks:
+            if track.window_start is not None and frame_index - track.window_start + 1 < self.window_frames:
+                continue
+            if track.attempted_at is None:
+                due.append(track)
+            elif frame_index - track.attempted_at < self.retry_frames:
+                continue
+            elif track.student_id is None or frame_index - track.recognized_at >= self.reverify_frames:
+                due.append(track)
+        return due
+
+    def record(self, track, student_id, confidence, frame_index):
+        """
+        Store a recognition result on a track
+
+        A failed re-verification keeps the identity already established;
+        a positive result always replaces it.
+        """
+        track.attempted_at = frame_index
+        track.attempts += 1
+        self.stats['recognitions'] += 1
+        self.stats['recognized_quality'] += track.best_score
+        track.window_start = None
+        if student_id:
+            track.student_id = student_id
+            track.confidence = confidence
+            track.recognized_at = frame_index
+
+    def skip(self, track, frame_index):
+        """Postpone recognition of a track whose best crop was too poor to be worth embedding"""
+        track.attempted_at = frame_index
+        track.window_start = None
+        self.stats['skipped_low_quality'] += 1
+
+    def status(self):
+        """Tracker statistics: recognitions per frame show how much recognition tracking saves"""
+        frames = self.stats['frames']
+        recognitions = self.stats['recognitions']
+        return {
+            **self.stats,
+            'recognized_quality': round(self.stats['recognized_quality'] / recognitions, 3) if recognitions else None,
+            'active_tracks': len(self.tracks),
+            'recognized_tracks': sum(track.student_id is not None for track in self.tracks),
+            'recognitions_per_frame': round(self.stats['recognitions'] / frames, 3) if frames else None
+        }
@@ -0,0 +1,492 @@
+import json
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl  # POSIX advisory locks for concurrent writer processes
+except ImportError:
+    fcntl = None
+
+
+class GalleryStore:
+    def __init__(self, folder, dtype='float32', compact_ratio=0.25):
+        """
+        Append-only, memory-mapped store for enrolled face embeddings
+
+        Layout of ``folder``:
+            manifest.json          current generation, embedding dim and dtype
+            embeddings.<gen>.bin   raw (rows, dim) matrix, only ever appended to
+            journal.<gen>.log      one JSON line per enroll/replace/delete, referencing row ranges
+            gallery.lock           lock file serializing writers across processes
+
+        Enrolling appends rows and a journal line, deleting appends a journal
+        line only; neither rewrites existing data. Compaction writes a new
+        generation with live rows grouped per student and switches to it by
+        atomically replacing the manifest, so a crash at any point leaves
+        either the old or the new generation intact.
+
+        Changes written by other processes are picked up incrementally by
+        changes(), which only reads the journal lines appended since the
+        last call.
+
+        Args:
+            folder: Directory holding the store files
+            dtype: 'float32' (loads zero-copy) or 'float16' (half the disk space); an existing
+                store keeps its dtype until the next compaction rewrites it in this one
+            compact_ratio: Compact once dead or fragmented rows exceed this fraction of live rows
+        """
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        self.configured_dtype = self.dtype
+        self.compact_ratio = compact_ratio
+        self.manifest_file = self.folder / 'manifest.json'
+        self.lock_file = self.folder / 'gallery.lock'
+        # Writers of this process queue on _writer_lock while waiting for the file
+        # lock; _thread_lock guards the in-memory state and is only taken once the
+        # file lock is held, so readers never wait on another process
+        self._writer_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self.generation = None
+        self.dim = None
+        self.records = {}
+        self.metadata = {}
+        self.dead_rows = 0
+        self._journal_offset = 0
+        self._row_map = None
+        self._manifest_stamp = None
+        self._changed = set()
+        self._reset_pending = False
+        self._read_manifest()
+
+    @property
+    def exists(self):
+        return self.manifest_file.exists()
+
+    @property
+    def embeddings_file(self):
+        return self.folder / f"embeddings.{self.generation}.bin"
+
+    @property
+    def journal_file(self):
+        return self.folder / f"journal.{self.generation}.log"
+
+    def load(self):
+        """
+        Load the live gallery
+
+        When live rows are already grouped per student in file order (always
+        true right after compaction) the returned matrix is a read-only
+        ``np.memmap`` over the file, i.e. no copy is made.
+
+        Returns:
+            Tuple of (matrix, student_ids, counts)
+        """
+        with self._locked():
+            matrix = self._map_embeddings()
+
+            student_ids = list(self.records)
+            counts = [sum(count for _, count in self.records[s]) for s in student_ids]
+            ranges = [r for s in student_ids for r in self.records[s]]
+
+            position = 0
+            grouped = True
+            for start, count in ranges:
+                if start != position:
+                    grouped = False
+                    break
+                position += count
+
+            # The result reflects every change so far
+            self._changed = set()
+            self._reset_pending = False
+
+            if grouped and self.dtype == np.float32:
+                return matrix[:position], student_ids, counts
+
+            if not ranges:
+                return np.empty((0, self.dim or 0), dtype=np.float32), [], []
+            rows = np.concatenate([matrix[start:start + count] for start, count in ranges])
+            return rows.astype(np.float32), student_ids, counts
+
+    def counts(self):
+        """
+        Number of stored embeddings of each student, without reading them
+
+        Unlike load(), this leaves the change tracking alone: foreign writes
+        it picks up are still reported by the next changes() call.
+
+        Returns:
+            Dict of student_id -> row count
+        """
+        with self._locked():
+            return {student_id: sum(count for _, count in ranges) for student_id, ranges in self.records.items()}
+
+    def changes(self):
+        """
+        Poll for changes written by other processes since the last load()/changes()
+
+        Cheap when nothing changed (two stat calls). Only new journal lines
+        are read, so the cost is proportional to the change. Never waits on
+        the cross-process writer lock.
+
+        Returns:
+            Tuple of (reset, student_ids): reset is True when another process
+            compacted the store (reload everything); student_ids is the set of
+            students whose embeddings changed otherwise
+        """
+        with self._thread_lock:
+            try:
+                stat = self.manifest_file.stat()
+                stamp = (stat.st_ino, stat.st_mtime_ns)
+            except OSError:
+                stamp = None
+            if stamp != self._manifest_stamp:
+                generation = self.generation
+                self._read_manifest()
+                if self.generation != generation:
+                    self._replay_journal(reset=True)
+
+            try:
+                if self.journal_file.stat().st_size > self._journal_offset:
+                    self._replay_journal()
+            except OSError:
+                pass  # Journal replaced by a concurrent compaction; seen on the next poll
+
+            changes = (self._reset_pending, self._changed)
+            self._changed = set()
+            self._reset_pending = False
+            return changes
+
+    def rows(self, student_id):
+        """
+        Stored embeddings of one student, read from the memory map
+
+        Used for exact re-ranking by quantized galleries, so it only takes
+        the in-process lock and never waits on other processes.
+
+        Args:
+            student_id: Student ID
+
+        Returns:
+            float32 array (n, dim), or None if the student is not stored
+        """
+        with self._thread_lock:
+            return self._read_rows(student_id)
+
+    def update_many(self, updates):
+        """
+        Read-modify-write the embeddings of several students under the writer lock
+
+        Reading and writing back happen while holding the cross-process lock,
+        so rows appended by another process in between cannot be lost (as they
+        would be with rows() followed by replace()).
+
+        Args:
+            updates: List of (student_id, update, image_path) tuples; update is called
+                with the student's stored embeddings (None if not stored) and returns
+                (embeddings, replace) to append to or supersede them, or None to skip
+
+        Returns:
+            List with the (embeddings, replace) result of each update
+        """
+        with self._locked():
+            results = [update(self._read_rows(student_id)) for student_id, update, _ in updates]
+            entries = [(student_id, result[0], image_path, result[1])
+                       for (student_id, _, image_path), result in zip(updates, results) if result is not None]
+            self._write_entries(entries)
+            return results
+
+    def update(self, student_id, update, image_path=None):
+        """
+        Read-modify-write one student's embeddings under the writer lock (see update_many)
+
+        Returns:
+            The (embeddings, replace) result of update, or None if it skipped the write
+        """
+        return self.update_many([(student_id, update, image_path)])[0]
+
+    def append(self, student_id, embeddings, image_path=None):
+        """
+        Append embeddings for a student
+
+        Args:
+            student_id: Student ID
+            embeddings: Array of (already normalized) embeddings (n, dim)
+            image_path: Optional path of the enrollment image
+        """
+        self.append_many([(student_id, embeddings, image_path)])
+
+    def replace(self, student_id, embeddings, image_path=None):
+        """
+        Replace all embeddings of a student (e.g. with consolidated prototypes)
+
+        Args:
+            student_id: Student ID
+            embeddings: Array of (already normalized) embeddings (n, dim)
+            image_path: Optional path of the enrollment image (kept if None)
+        """
+        self.append_many([(student_id, embeddings, image_path)], replace=True)
+
+    def append_many(self, entries, replace=False):
+        """
+        Append embeddings for several students with a single write and fsync
+
+        Args:
+            entries: List of (student_id, embeddings, image_path) tuples
+            replace: Supersede each student's existing embeddings instead of adding to them;
+                a single journal line per student, so a crash never loses both old and new rows
+        """
+        with self._locked():
+            self._write_entries([(student_id, embeddings, image_path, replace)
+                                 for student_id, embeddings, image_path in entries])
+
+    def delete(self, student_id):
+        """
+        Mark all embeddings of a student as deleted
+
+        Args:
+            student_id: Student ID
+
+        Returns:
+            True if the student was present, False otherwise
+        """
+        with self._locked():
+            if student_id not in self.records:
+                return False
+            self._append_journal({'op': 'delete', 'student_id': student_id})
+            return True
+
+    def needs_compaction(self):
+        """Whether dead rows, fragmented students or a dtype change justify rewriting the store"""
+        live_rows = sum(count for ranges in self.records.values() for _, count in ranges)
+        fragmented = sum(len(ranges) - 1 for ranges in self.records.values())
+        return (self.dtype != self.configured_dtype and live_rows > 0
+                or self.dead_rows > self.compact_ratio * max(live_rows, 1)
+                or fragmented > self.compact_ratio * max(len(self.records), 1))
+
+    def compact(self):
+        """Rewrite live rows grouped per student into a new generation (in the configured dtype)"""
+        with self._locked():
+            self._compact()
+
+    def import_pickle(self, pickle_path, normalize):
+        """
+        One-time migration from the legacy face_encodings.pkl dict
+
+        The store is checked under the writer lock, so when several processes
+        start at once only the first one imports.
+
+        Args:
+            pickle_path: Path to face_encodings.pkl
+            normalize: Function that L2-normalizes an (n, dim) array
+
+        Returns:
+            Number of students imported (0 if the store already existed)
+        """
+        with self._locked():
+            if self.dim is not None:
+                return 0
+            with open(pickle_path, 'rb') as f:
+                face_database = pickle.load(f)
+
+            self._write_entries([
+                (student_id, normalize(data.get('embeddings', [data['embedding']])), data.get('image_path'), False)
+                for student_id, data in face_database.items()
+            ])
+            self._compact()
+            return len(face_database)
+
+    @contextmanager
+    def _locked(self):
+        """Serialize writers across threads and processes, picking up foreign changes first"""
+        with self._writer_lock, open(self.lock_file, 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                with self._thread_lock:
+                    generation = self.generation
+                    self._read_manifest()
+                    self._replay_journal(reset=self.generation != generation)
+                    yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _compact(self):
+        """Body of compact(); lock held"""
+        if self.dim is None:
+            return
+        matrix = self._map_embeddings()
+        generation = self.generation + 1
+        embeddings_file = self.folder / f"embeddings.{generation}.bin"
+        journal_file = self.folder / f"journal.{generation}.log"
+
+        position = 0
+        with open(embeddings_file, 'wb') as emb, open(journal_file, 'w') as journal:
+            for student_id, ranges in self.records.items():
+                rows = np.concatenate([matrix[start:start + count] for start, count in ranges])
+                emb.write(np.ascontiguousarray(rows, dtype=self.configured_dtype).tobytes())
+                journal.write(json.dumps({
+                    'op': 'enroll',
+                    'student_id': student_id,
+                    'start': position,
+                    'count': rows.shape[0],
+                    'image_path': self.metadata.get(student_id)
+                }) + '\n')
+                position += rows.shape[0]
+            for f in (emb, journal):
+                f.flush()
+                os.fsync(f.fileno())
+
+        old_files = (self.embeddings_file, self.journal_file)
+        self.dtype = self.configured_dtype
+        self._write_manifest(generation, self.dim)
+        # Same live data under new offsets; not a change callers need to reload
+        self._replay_journal(reset=True, track=False)
+        for path in old_files:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _write_entries(self, entries):
+        """Append rows and journal lines for (student_id, embeddings, image_path, replace) entries; lock held"""
+        blocks = [np.atleast_2d(embeddings) for _, embeddings, _, _ in entries]
+        if not blocks:
+            return
+        if self.dim is None:
+            self._write_manifest(0, blocks[0].shape[1])
+        row_bytes = self.dim * self.dtype.itemsize
+
+        with open(self.embeddings_file, 'ab') as f:
+            # Drop a partial row left by a crashed writer before appending
+            size = f.seek(0, os.SEEK_END)
+            start = size // row_bytes
+            if size % row_bytes:
+                os.ftruncate(f.fileno(), start * row_bytes)
+            f.write(np.ascontiguousarray(np.concatenate(blocks), dtype=self.dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        journal_entries = []
+        for (student_id, _, image_path, replace), rows in zip(entries, blocks):
+            journal_entries.append({
+                'op': 'replace' if replace else 'enroll',
+                'student_id': student_id,
+                'start': start,
+                'count': rows.shape[0],
+                'image_path': image_path
+            })
+            start += rows.shape[0]
+        self._append_journal(*journal_entries)
+
+    def _read_rows(self, student_id):
+        """A student's stored rows as float32 from the cached memory map; lock held"""
+        ranges = self.records.get(student_id)
+        if not ranges:
+            return None
+        end = max(start + count for start, count in ranges)
+        if self._row_map is None or self._row_map[0] != self.generation or len(self._row_map[1]) < end:
+            try:
+                self._row_map = (self.generation, self._map_embeddings())
+            except OSError:
+                return None
+        matrix = self._row_map[1]
+        return np.concatenate([matrix[start:start + count] for start, count in ranges]).astype(np.float32)
+
+    def _read_manifest(self):
+        if not self.manifest_file.exists():
+            self.generation, self.dim = 0, None
+            return
+        stat = self.manifest_file.stat()
+        self._manifest_stamp = (stat.st_ino, stat.st_mtime_ns)
+        with open(self.manifest_file) as f:
+            manifest = json.load(f)
+        self.generation = manifest['generation']
+        self.dim = manifest['dim']
+        dtype = np.dtype(manifest['dtype'])
+        if dtype != self.dtype and dtype != self.configured_dtype:
+            print(f"Gallery store holds {dtype.name} rows but GALLERY_STORE_DTYPE is "
+                  f"{self.configured_dtype.name}; reading {dtype.name} until the next compaction converts it")
+        self.dtype = dtype
+
+    def _write_manifest(self, generation, dim):
+        temp_file = self.manifest_file.with_suffix('.tmp')
+        with open(temp_file, 'w') as f:
+            json.dump({'generation': generation, 'dim': dim, 'dtype': self.dtype.name}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_file.replace(self.manifest_file)
+        stat = self.manifest_file.stat()
+        self._manifest_stamp = (stat.st_ino, stat.st_mtime_ns)
+        self.generation, self.dim = generation, dim
+
+    def _map_embeddings(self):
+        """Read-only memory map of the current embeddings file (complete rows only)"""
+        if self.dim is None or not self.embeddings_file.exists():
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        rows = self.embeddings_file.stat().st_size // (self.dim * self.dtype.itemsize)
+        if rows == 0:
+            return np.empty((0, self.dim), dtype=self.dtype)
+        return np.memmap(self.embeddings_file, dtype=self.dtype, mode='r', shape=(rows, self.dim))
+
+    def _replay_journal(self, reset=False, track=True):
+        """
+        Apply journal lines written since the last replay (all of them if reset)
+
+        Lines replayed here were written by other processes; with track they
+        are reported by the next changes() call.
+        """
+        if reset:
+            self.records, self.metadata = {}, {}
+            self.dead_rows = 0
+            self._journal_offset = 0
+            if track:
+                self._reset_pending = True
+                self._changed = set()
+        if not self.journal_file.exists():
+            return
+
+        with open(self.journal_file, 'rb') as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Partially written line from a crashed writer; ignored
+                self._journal_offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(entry)
+                if track and not self._reset_pending:
+                    self._changed.add(entry['student_id'])
+
+    def _apply(self, entry):
+        student_id = entry['student_id']
+        if entry['op'] == 'replace' and student_id in self.records:
+            self.dead_rows += sum(count for _, count in self.records.pop(student_id))
+        if entry['op'] in ('enroll', 'replace'):
+            self.records.setdefault(student_id, []).append((entry['start'], entry['count']))
+            if entry.get('image_path'):
+                self.metadata[student_id] = entry['image_path']
+        elif entry['op'] == 'delete' and student_id in self.records:
+            self.dead_rows += sum(count for _, count in self.records.pop(student_id))
+            self.metadata.pop(student_id, None)
+
+    def _append_journal(self, *entries):
+        with open(self.journal_file, 'ab') as f:
+            # Drop a partial line left by a crashed writer; it was never committed
+            if f.seek(0, os.SEEK_END) > self._journal_offset:
+                os.ftruncate(f.fileno(), self._journal_offset)
+            f.write(''.join(json.dumps(entry) + '\n' for entry in entries).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_offset = self.journal_file.stat().st_size
+        for entry in entries:
+            self._apply(entry)
@@ -0,0 +1,347 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from config import Config
+from face_detector import FaceDetector
+
+
+def analyze_frames(get_detector, recognizer, tasks):
+    """
+    Detect and recognize faces in several frames
+
+    Frames using the same detector backend are detected in one batch, and
+    faces of all frames that share a candidate set (e.g. the same course
+    roster) and crop type are recognized in a single batched call.
+
+    Args:
+        get_detector: Callable returning the FaceDetector of a backend name
+            (None for the default backend)
+        recognizer: FaceRecognizer instance
+        tasks: List of (frame, candidates) or (frame, candidates, backend)
+            tuples; candidates and backend may be None
+
+    Returns:
+        List of (boxes, results) per frame, results being [(student_id, confidence), ...]
+    """
+    backends = {}
+    for i, task in enumerate(tasks):
+        backends.setdefault(task[2] if len(task) > 2 else None, []).append(i)
+
+    boxes = [None] * len(tasks)
+    tight = [False] * len(tasks)
+    for backend, members in backends.items():
+        detector = get_detector(backend)
+        for i, frame_boxes in zip(members, detector.detect_faces_batch([tasks[i][0] for i in members])):
+            boxes[i] = frame_boxes
+            tight[i] = detector.tight_boxes
+    crops = [[FaceDetector.extract_face(task[0], box) for box in frame_boxes]
+             for task, frame_boxes in zip(tasks, boxes)]
+
+    groups = {}
+    for i, task in enumerate(tasks):
+        groups.setdefault((task[1], tight[i]), []).append(i)
+
+    analyzed = [None] * len(tasks)
+    for (candidates, tight_boxes), members in groups.items():
+        matches = recognizer.recognize_faces([crop for i in members for crop in crops[i]], candidates, tight_boxes)
+        position = 0
+        for i in members:
+            analyzed[i] = (boxes[i], matches[position:position + len(crops[i])])
+            position += len(crops[i])
+    return analyzed
+
+
+def _run_batch(get_detector, recognizer, batch):
+    """Run one batch of (task_id, kind, args) tasks: [(task_id, status, value), ...]"""
+    outcomes = []
+    analyze = [task for task in batch if task[1] == 'analyze']
+    if analyze:
+        try:
+            results = analyze_frames(get_detector, recognizer, [args for _, _, args in analyze])
+            outcomes.extend((task_id, 'ok', result) for (task_id, _, _), result in zip(analyze, results))
+        except Exception as e:
+            outcomes.extend((task_id, 'error', str(e)) for task_id, _, _ in analyze)
+
+    for task_id, kind, args in batch:
+        if kind == 'analyze':
+            continue
+        try:
+            if kind == 'detect':
+                frame, *backend = args
+                value = get_detector(*backend).detect_faces(frame)
+            elif kind == 'detect_batch':
+                frames, *backend = args
+                value = get_detector(*backend).detect_faces_batch(frames)
+            elif kind == 'detect_arrays':
+                frames, *backend = args
+                value = get_detector(*backend).detect_batch(frames)
+            elif kind == 'recognize':
+                value = recognizer.recognize_faces(*args)
+            elif kind == 'recognize_top_k':
+                value = recognizer.recognize_faces_top_k(*args)
+            elif kind == 'enroll':
+                value = recognizer.enroll_face(*args)
+            elif kind == 'enroll_bulk':
+                value = recognizer.enroll_faces(*args)
+            else:
+                raise ValueError(f"Unknown inference task '{kind}'")
+            outcomes.append((task_id, 'ok', value))
+        except Exception as e:
+            outcomes.append((task_id, 'error', str(e)))
+    return outcomes
+
+
+def _worker_main(worker_id, tasks, results, max_batch, batch_wait):
+    """Worker process: load the models once, then serve batches from the task queue"""
+    from face_recognizer import FaceRecognizer
+
+    # The default detector loads up front; other backends on their first task
+    detectors = {}
+    def get_detector(backend=None):
+        backend = backend or Config.DETECTOR_BACKEND
+        if backend not in detectors:
+            detectors[backend] = FaceDetector(backend)
+        return detectors[backend]
+
+    try:
+        get_detector()
+        recognizer = FaceRecognizer()
+    except Exception as e:
+        results.put((None, 'failed', (worker_id, str(e)), 0))
+        return
+    results.put((None, 'ready', worker_id, 0))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        # Lets the dispatcher fail the task if this process dies while running it
+        results.put((task[0], 'taken', worker_id, 0))
+
+        # Collect whatever else arrives within the batching window
+        batch = [task]
+        stop = False
+        deadline = time.monotonic() + batch_wait
+        while len(batch) < max_batch:
+            try:
+                task = tasks.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if task is None:
+                stop = True
+                break
+            results.put((task[0], 'taken', worker_id, 0))
+            batch.append(task)
+
+        for task_id, status, value in _run_batch(get_detector, recognizer, batch):
+            results.put((task_id, status, value, len(batch)))
+        if stop:
+            break
+
+
+class InferencePool:
+    def __init__(self, workers=2, queue_size=32, max_batch=8, batch_wait_ms=5):
+        """
+        Pool of worker processes running face detection and recognition
+
+        Each worker loads FaceDetector and FaceRecognizer once. Work is fed
+        through a bounded queue; a worker takes up to ``max_batch`` tasks
+        that arrive within ``batch_wait_ms`` and runs them together, so
+        concurrent requests share forward passes. Callers get a
+        ``concurrent.futures.Future`` per task. Workers are started on first
+        use (or with start()); enrollments made by one worker reach the
+        others through the gallery hot reload. A worker that dies (crash,
+        out-of-memory kill) is restarted, and the tasks it had taken fail
+        instead of waiting forever.
+
+        Args:
+            workers: Number of worker processes
+            queue_size: Maximum queued tasks; submit() waits (then fails) when full
+            max_batch: Maximum tasks run together by one worker
+            batch_wait_ms: How long a worker waits to fill a batch
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000.0
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._processes = []
+        self._tasks = None
+        self._results = None
+        self._futures = {}
+        self._owners = {}
+        self._stopping = False
+        self._ids = itertools.count()
+        self._ready = set()
+        self._errors = {}
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'batched': 0, 'restarts': 0}
+
+    @property
+    def started(self):
+        return bool(self._processes)
+
+    @property
+    def ready(self):
+        return len(self._ready) > 0
+
+    def start(self):
+        """Start the worker processes and the result dispatcher (idempotent)"""
+        with self._lock:
+            if self._processes:
+                return
+            self._tasks = self._context.Queue(self.queue_size)
+            self._results = self._context.Queue()
+            self._processes = [self._spawn(worker_id) for worker_id in range(self.workers)]
+            threading.Thread(target=self._dispatch, name='inference-dispatch', daemon=True).start()
+            print(f"Started {self.workers} inference workers")
+
+    def _spawn(self, worker_id):
+        """Start one worker process"""
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self._tasks, self._results, self.max_batch, self.batch_wait),
+            name=f"inference-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def submit(self, kind, *args, timeout=None):
+        """
+        Queue a task for the workers
+
+        Args:
+            kind: 'analyze' (frame, candidates[, backend]), 'detect' (frame[, backend]),
+                'detect_batch' (frames[, backend]), 'detect_arrays' (frames[, backend]),
+                'recognize' (face_images, candidates), 'recognize_top_k'
+                (face_images, candidates, k), 'enroll' (student_id, image)
+                or 'enroll_bulk' (items)
+            *args: Arguments of the task
+            timeout: Seconds to wait for room in the queue (None waits forever)
+
+        Returns:
+            Future resolving to the task's result
+
+        Raises:
+            RuntimeError: If the queue stayed full for the whole timeout
+        """
+        self.start()
+        if len(self._errors) == self.workers:
+            raise RuntimeError("No inference worker could load the models")
+        task_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            self._futures[task_id] = future
+            self.stats['submitted'] += 1
+        try:
+            self._tasks.put((task_id, kind, args), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._futures.pop(task_id, None)
+            raise RuntimeError("Inference queue is full, try again later")
+        return future
+
+    def status(self):
+        """Worker and queue information for health checks"""
+        with self._lock:
+            completed = self.stats['completed'] + self.stats['failed']
+            return {
+                'workers': self.workers,
+                'alive': sum(process.is_alive() for process in self._processes),
+                'ready': len(self._ready),
+                'errors': dict(self._errors),
+                'pending': len(self._futures),
+                'submitted': self.stats['submitted'],
+                'completed': self.stats['completed'],
+                'failed': self.stats['failed'],
+                'restarts': self.stats['restarts'],
+                'mean_batch_size': round(self.stats['batched'] / completed, 2) if completed else None
+            }
+
+    def shutdown(self):
+        """Ask the workers to exit after the queued tasks"""
+        self._stopping = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+
+    def _dispatch(self):
+        """Resolve futures from worker results and restart workers that died"""
+        last_check = time.monotonic()
+        while True:
+            try:
+                self._handle(*self._results.get(timeout=1))
+            except queue.Empty:
+                pass
+            if time.monotonic() - last_check >= 1:
+                self._check_workers()
+                last_check = time.monotonic()
+
+    def _check_workers(self):
+        """Fail the tasks of crashed workers and start replacements"""
+        # Exit code 0 is a shutdown or a worker that could not load the models
+        dead = [worker_id for worker_id, process in enumerate(self._processes)
+                if not process.is_alive() and process.exitcode != 0]
+        if not dead or self._stopping:
+            return
+        # Results the workers sent before dying are still in the queue
+        while True:
+            try:
+                self._handle(*self._results.get_nowait())
+            except queue.Empty:
+                break
+
+        for worker_id in dead:
+            exitcode = self._processes[worker_id].exitcode
+            with self._lock:
+                lost = [task_id for task_id, owner in self._owners.items() if owner == worker_id]
+                futures = [self._futures.pop(task_id, None) for task_id in lost]
+                for task_id in lost:
+                    del self._owners[task_id]
+                self.stats['failed'] += len(lost)
+                self.stats['restarts'] += 1
+                self._ready.discard(worker_id)
+                self._processes[worker_id] = self._spawn(worker_id)
+            print(f"Inference worker {worker_id} died (exit code {exitcode}), "
+                  f"failed {len(lost)} tasks and restarted it")
+            for future in futures:
+                if future is not None:
+                    future.set_exception(RuntimeError(f"Inference worker {worker_id} died (exit code {exitcode})"))
+
+    def _handle(self, task_id, status, value, batch_size):
+        """Apply one message from the result queue"""
+        with self._lock:
+            if status == 'taken':
+                if task_id in self._futures:
+                    self._owners[task_id] = value
+                return
+            if status == 'ready':
+                self._ready.add(value)
+                return
+            if status == 'failed':
+                worker_id, error = value
+                self._errors[worker_id] = error
+                print(f"Inference worker {worker_id} failed to start: {error}")
+                if len(self._errors) == self.workers:
+                    # Nobody will ever serve the queued tasks
+                    for future in self._futures.values():
+                        future.set_exception(RuntimeError(f"Inference workers failed to start: {error}"))
+                    self._futures.clear()
+                    self._owners.clear()
+                return
+            future = self._futures.pop(task_id, None)
+            self._owners.pop(task_id, None)
+            self.stats['completed' if status == 'ok' else 'failed'] += 1
+            self.stats['batched'] += batch_size
+        if future is None:
+            return
+        if status == 'ok':
+            future.set_result(value)
+        else:
+            future.set_exception(RuntimeError(value))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Migration script to move face embeddings from face_encodings.pkl into the
+append-only, memory-mapped gallery store
+"""
+
+import sys
+from config import Config
+from face_gallery import FaceGallery
+from gallery_store import GalleryStore
+
+def migrate():
+    """Import face_encodings.pkl into the gallery store"""
+    pickle_path = Config.MODELS_FOLDER / 'face_encodings.pkl'
+
+    try:
+        store = GalleryStore(Config.GALLERY_FOLDER, dtype=Config.GALLERY_STORE_DTYPE)
+
+        if store.exists:
+            print(f"✓ Gallery store already exists in {Config.GALLERY_FOLDER}")
+            return True
+
+        if not pickle_path.exists():
+            print(f"✓ No {pickle_path.name} found, nothing to migrate")
+            return True
+
+        print(f"Importing {pickle_path}...")
+        count = store.import_pickle(pickle_path, FaceGallery.normalize)
+        matrix, student_ids, counts = store.load()
+
+        print(f"✓ Migrated {count} students ({matrix.shape[0]} embeddings) to {Config.GALLERY_FOLDER}")
+        print(f"  {pickle_path.name} was left in place as a backup")
+        return True
+
+    except Exception as e:
+        print(f"✗ Error during migration: {e}")
+        return False
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Migration: face_encodings.pkl -> gallery store")
+    print("=" * 60)
+
+    success = migrate()
+
+    if success:
+        print("\n✓ Migration completed successfully!")
+        sys.exit(0)
+    else:
+        print("\n✗ Migration failed!")
+        sys.exit(1)
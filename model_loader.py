@@ -0,0 +1,83 @@
+import threading
+import time
+
+
+class LazyModel:
+    def __init__(self, name, factory):
+        """
+        Thread-safe, load-on-first-use wrapper around a heavy model object
+
+        Attribute access is forwarded to the wrapped instance, so a LazyModel
+        can be used in place of the object it builds (e.g.
+        ``face_detector.detect_faces(frame)``). The factory runs at most once,
+        even when several request threads hit it at the same time.
+
+        Args:
+            name: Name reported by status()
+            factory: Zero-argument callable that imports and builds the model
+        """
+        self.name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self._load_seconds = None
+        self._error = None
+
+    @property
+    def ready(self):
+        return self._instance is not None
+
+    def get(self):
+        """Return the model instance, loading it on first use"""
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                self._loading = True
+                start = time.perf_counter()
+                try:
+                    self._instance = self._factory()
+                    self._error = None
+                except Exception as e:
+                    self._error = str(e)
+                    raise
+                finally:
+                    self._loading = False
+                    self._load_seconds = time.perf_counter() - start
+                print(f"Loaded {self.name} in {self._load_seconds:.1f}s")
+            return self._instance
+
+    def warm_up(self):
+        """
+        Start loading the model in a background thread
+
+        Returns:
+            The started daemon thread
+        """
+        def load():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"Warm-up of {self.name} failed: {str(e)}")
+
+        thread = threading.Thread(target=load, name=f"warmup-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        """Readiness information for health checks"""
+        return {
+            'ready': self.ready,
+            'loading': self._loading,
+            'load_seconds': round(self._load_seconds, 2) if self._load_seconds is not None else None,
+            'error': self._error
+        }
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper itself
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(self, threshold=0.005, pixel_threshold=25, width=160, max_skip=30):
+        """
+        Cheap frame differencing that decides whether a frame needs detection
+
+        Each frame is shrunk to ``width`` pixels, converted to grayscale and
+        blurred, then compared with the last frame detection ran on. If less
+        than ``threshold`` of its pixels changed by more than
+        ``pixel_threshold`` gray levels, nothing moved and the previous boxes
+        can be reused. Comparing against the last detected frame (rather
+        than the previous one) makes slow changes add up until they trigger.
+
+        Args:
+            threshold: Fraction of changed pixels that counts as motion
+            pixel_threshold: Gray-level difference that counts as a changed pixel
+            width: Width of the downsampled comparison frame
+            max_skip: Detection is forced after this many skipped frames (0 never forces)
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.max_skip = max_skip
+        self._reference = None
+        self._skipped = 0
+        self.last_motion = None
+        self.stats = {'frames': 0, 'detected': 0, 'skipped': 0, 'forced': 0}
+
+    def check(self, frame):
+        """
+        Compare a frame with the last detected one
+
+        Args:
+            frame: OpenCV image/frame
+
+        Returns:
+            True if detection should run on the frame, False to reuse the previous boxes
+        """
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, round(height * self.width / width))),
+                           interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        self.stats['frames'] += 1
+
+        if self._reference is None or self._reference.shape != small.shape:
+            return self._detect(small)
+
+        changed = cv2.absdiff(small, self._reference) > self.pixel_threshold
+        self.last_motion = float(np.count_nonzero(changed)) / changed.size
+        if self.last_motion >= self.threshold:
+            return self._detect(small)
+        if self.max_skip and self._skipped >= self.max_skip:
+            # Refresh now and then so detector scores and tracks stay current
+            self.stats['forced'] += 1
+            return self._detect(small)
+
+        self._skipped += 1
+        self.stats['skipped'] += 1
+        return False
+
+    def _detect(self, small):
+        self._reference = small
+        self._skipped = 0
+        self.stats['detected'] += 1
+        return True
+
+    def status(self):
+        """Gate statistics: the skipped fraction is the share of frames that did not run detection"""
+        frames = self.stats['frames']
+        return {
+            **self.stats,
+            'skipped_fraction': round(self.stats['skipped'] / frames, 3) if frames else None,
+            'last_motion': round(self.last_motion, 4) if self.last_motion is not None else None
+        }
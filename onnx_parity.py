@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+from config import Config
+
+try:
+    import fcntl  # POSIX advisory locks for concurrent writer processes
+except ImportError:
+    fcntl = None
+
+# The detector and the recognizer warm up on separate threads and both record here
+_lock = threading.Lock()
+
+
+def _parity_file():
+    return Config.ONNX_MODELS_FOLDER / 'parity.json'
+
+
+def read_parity():
+    """
+    Recorded parity results of the exported ONNX models
+
+    Returns:
+        Dict of model file name -> parity result
+    """
+    parity_file = _parity_file()
+    return json.loads(parity_file.read_text()) if parity_file.exists() else {}
+
+
+def record_parity(name, result):
+    """
+    Store one model's parity result in models/onnx/parity.json
+
+    The file is re-read under a thread and cross-process lock before the
+    entry is merged in, so results recorded concurrently for other models
+    are kept, and it is replaced atomically.
+
+    Args:
+        name: Model file name (e.g. "Facenet512.int8.onnx")
+        result: Parity result dict
+    """
+    parity_file = _parity_file()
+    parity_file.parent.mkdir(parents=True, exist_ok=True)
+    with _lock, open(parity_file.with_suffix('.lock'), 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            parity = read_parity()
+            parity[name] = result
+            temp_file = parity_file.with_name(f"{parity_file.stem}.{os.getpid()}.tmp")
+            temp_file.write_text(json.dumps(parity, indent=2))
+            temp_file.replace(parity_file)
+        finally:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)